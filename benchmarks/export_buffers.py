@@ -0,0 +1,203 @@
+"""Compares rendering the XLSX/DOCX exports through a temporary file against
+rendering them straight into memory.
+
+The bytes copied once a document is serialized are counted by wrapping the files and
+buffers they go through. The production render paths are measured as well: in a
+thread the document stays in memory, while a render in a worker process, see
+`extras.exporter.render_document`, is written to a temporary file and read back so
+it isn't pickled to the parent.
+
+Usage:
+    python -m benchmarks.export_buffers [--rows 5000] [--repeat 5]
+"""
+import argparse
+import os
+from io import BytesIO
+from queue import Queue
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+from unittest import mock
+
+from docx import Document
+from openpyxl.workbook import Workbook
+
+from extras import exporter as exporter_module
+from extras.exporter import (
+    EXPORT_CHUNK_SIZE,
+    RENDER_ROW_CHUNK_SIZE,
+    ExportData,
+    FileFormat,
+    get_exporter_class,
+    read_in_chunks,
+    render_document,
+)
+
+HEADERS = ("First Name", "Middle Name", "Last Name", "Matriculation Number")
+METADATA = {"Display Name": "Benchmark", "School": "School", "Level": 100}
+
+
+class CountingFile:
+    """Proxies a file or buffer, counting the bytes written to and read from it"""
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def write(self, data) -> int:
+        self.count += len(data)
+        return self.file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.count += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __enter__(self) -> "CountingFile":
+        self.file.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.file.__exit__(*exc_info)
+
+
+def get_rows(rows: int) -> list[tuple]:
+    return [
+        ("Ada", "Ngozi", f"Obi {row_no}", f"MAT/{row_no:06}") for row_no in range(rows)
+    ]
+
+
+def build_workbook(rows: int) -> Workbook:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADERS)
+    for row in get_rows(rows):
+        sheet.append(row)
+    return workbook
+
+
+def build_document(rows: int) -> Document:
+    document = Document()
+    table = document.add_table(rows=rows + 1, cols=len(HEADERS))
+    for cell, header in zip(table.rows[0].cells, HEADERS):
+        cell.text = header
+    return document
+
+
+def save_through_tempfile(document) -> int:
+    """The previous render path, returns the number of bytes copied after saving"""
+    with NamedTemporaryFile() as tmp:
+        document.save(tmp.name)
+        tmp.seek(0)
+        file = CountingFile(tmp)
+        buffer = CountingFile(BytesIO())
+        # Read back from disk and copied into a new buffer
+        buffer.write(file.read())
+        buffer.seek(0)
+        return file.count + buffer.count
+
+
+def save_in_memory(document) -> int:
+    """The current render path, returns the number of bytes copied after saving"""
+    buffer = BytesIO()
+    document.save(buffer)
+    return sum(len(chunk) for chunk in read_in_chunks(buffer))
+
+
+def read_back(file) -> None:
+    """Reads a rendered file as `extras.executor.ExportExecutor` streams it"""
+    while file.read(EXPORT_CHUNK_SIZE):
+        pass
+
+
+def render_in_thread(format: FileFormat, rows: list[tuple]) -> int:
+    """Renders with the exporter as a thread pool executor does, returns the number of
+    bytes copied after rendering"""
+    exporter = get_exporter_class(format)()
+    exporter.load_data(ExportData(HEADERS, rows, METADATA))
+    buffer = exporter.render(rows)
+    buffer.seek(0)
+    file = CountingFile(buffer)
+    read_back(file)
+    return file.count
+
+
+def render_in_process(format: FileFormat, rows: list[tuple]) -> int:
+    """Renders through `render_document` as a process pool executor does, in this
+    process, returns the number of bytes copied after rendering"""
+    queue = Queue()
+    for start in range(0, len(rows), RENDER_ROW_CHUNK_SIZE):
+        queue.put(rows[start : start + RENDER_ROW_CHUNK_SIZE])
+    queue.put(None)
+    written = []
+
+    def counting_tempfile(**kwargs) -> CountingFile:
+        written.append(CountingFile(NamedTemporaryFile(**kwargs)))
+        return written[-1]
+
+    tempfile = exporter_module.tempfile
+    with mock.patch.object(tempfile, "NamedTemporaryFile", counting_tempfile):
+        path = render_document(get_exporter_class(format), HEADERS, METADATA, queue)
+    try:
+        with open(path, "rb") as rendered:
+            file = CountingFile(rendered)
+            read_back(file)
+    finally:
+        os.remove(path)
+    return written[0].count + file.count
+
+
+def measure(render, argument, repeat: int, *args) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        copied = render(argument, *args)
+        timings.append(perf_counter() - start)
+    return min(timings), copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("Saving a built document")
+    print(f"{'format':<6} {'path':<10} {'best (ms)':>10} {'bytes copied':>14}")
+    for name, document in (
+        ("xlsx", build_workbook(args.rows)),
+        ("docx", build_document(args.rows)),
+    ):
+        for path, render in (
+            ("tempfile", save_through_tempfile),
+            ("in-memory", save_in_memory),
+        ):
+            seconds, copied = measure(render, document, args.repeat)
+            print(f"{name:<6} {path:<10} {seconds * 1000:>10.1f} {copied:>14,}")
+
+    print(f"\nRendering {args.rows} rows as the export executors do")
+    print(f"{'format':<6} {'executor':<10} {'best (ms)':>10} {'bytes copied':>14}")
+    rows = get_rows(args.rows)
+    for format in (FileFormat.EXCEL, FileFormat.DOCUMENT):
+        for executor, render in (
+            ("thread", render_in_thread),
+            ("process", render_in_process),
+        ):
+            seconds, copied = measure(render, format, args.repeat, rows)
+            print(
+                f"{format.value:<6} {executor:<10} {seconds * 1000:>10.1f} "
+                f"{copied:>14,}"
+            )
+    print(
+        "\nA process render writes its document to a temporary file and the parent "
+        "reads it back,\nwhich copies twice the bytes of a thread render but doesn't "
+        "pickle the document between\nthe processes. The process timings leave out "
+        "sending the "
+        "rows to the worker process."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Benchmarks every exporter over synthetic rosters of several sizes.
+
+For each format and roster size the wall time, the peak memory allocated while
+exporting (traced with tracemalloc) and the size of the output are measured. No
+database is needed, rows are generated lazily like a server side cursor yields them.
+The CSV path is measured through `CSVExporter` since `COPY` needs postgres.
+
+Usage:
+    python -m benchmarks.exporters [--sizes 100 10000 100000] [--formats csv json]
+        [--output results.json] [--compare previous-results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+from benchmarks.synthetic import make_export_data
+from extras.exporter import FileFormat, get_exporter
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+
+
+async def export(format: FileFormat, rows: int) -> int:
+    exporter = get_exporter(format)
+    exporter.load_data(make_export_data(rows))
+    size = 0
+    async for chunk in exporter.export():
+        size += len(chunk)
+    return size
+
+
+def measure(format: FileFormat, rows: int) -> dict:
+    # Time and trace separate runs, tracing allocations slows the export down
+    start = perf_counter()
+    size = asyncio.run(export(format, rows))
+    seconds = perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        asyncio.run(export(format, rows))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "format": format.value,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "peak_bytes": peak,
+        "output_bytes": size,
+    }
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], previous: list[dict]):
+    """Prints the change of every measurement against previous results"""
+    baseline = {(result["format"], result["rows"]): result for result in previous}
+    print(f"\n{'format':<7} {'rows':>7} {'time':>9} {'peak':>9} {'output':>9}")
+    for result in results:
+        before = baseline.get((result["format"], result["rows"]))
+        if not before:
+            continue
+        changes = [
+            f"{(result[key] - before[key]) / before[key]:>+9.1%}"
+            if before[key]
+            else f"{'n/a':>9}"
+            for key in ("seconds", "peak_bytes", "output_bytes")
+        ]
+        print(f"{result['format']:<7} {result['rows']:>7} {' '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--formats",
+        type=FileFormat,
+        nargs="+",
+        default=list(FileFormat),
+        help=" ".join(format.value for format in FileFormat),
+    )
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--compare", help="json results of a previous run")
+    args = parser.parse_args()
+
+    print(
+        f"{'format':<7} {'rows':>7} {'time (s)':>9} {'peak (KiB)':>11} {'output (KiB)':>13}"
+    )
+    results = []
+    for format in args.formats:
+        for rows in args.sizes:
+            result = measure(format, rows)
+            results.append(result)
+            print(
+                f"{format.value:<7} {rows:>7} {result['seconds']:>9.3f} "
+                f"{result['peak_bytes'] / 1024:>11.0f} "
+                f"{result['output_bytes'] / 1024:>13.0f}",
+                flush=True,
+            )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "revision": get_revision(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measures the throughput of the PDF exporter in pages per second against the
+DOCX exporter rendering the same rows.
+
+Usage:
+    python -m benchmarks.pdf_throughput [--rows 2000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+
+from benchmarks.synthetic import HEADERS, METADATA, iterate_rows, make_rows
+from extras.exporter import ExportData, PDFExporter
+from extras.word import DOCXExporter
+
+
+async def render_pdf(rows: list[tuple]) -> int:
+    exporter = PDFExporter()
+    exporter.load_data(ExportData(HEADERS, iterate_rows(len(rows)), METADATA))
+    size = 0
+    async for chunk in exporter.export():
+        size += len(chunk)
+    return size
+
+
+def render_docx(rows: list[tuple]) -> int:
+    exporter = DOCXExporter()
+    exporter.load_data(ExportData(HEADERS, rows, METADATA))
+    return len(exporter.render(rows).getbuffer())
+
+
+def best_of(repeat: int, render) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        render()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    probe = PDFExporter()
+    probe.load_data(ExportData(HEADERS, (), METADATA))
+    pages = 1
+    remaining = args.rows - probe.page_capacity(1)
+    while remaining > 0:
+        pages += 1
+        remaining -= probe.page_capacity(pages)
+
+    pdf = best_of(args.repeat, lambda: asyncio.run(render_pdf(rows)))
+    docx = best_of(args.repeat, lambda: render_docx(rows))
+    print(f"{args.rows} rows, {pages} PDF pages (DOCX rates use the same page count)")
+    print(f"{'exporter':<8} {'best (s)':>9} {'pages/s':>10} {'rows/s':>10}")
+    for name, seconds in (("pdf", pdf), ("docx", docx)):
+        print(
+            f"{name:<8} {seconds:>9.3f} {pages / seconds:>10.1f} "
+            f"{args.rows / seconds:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
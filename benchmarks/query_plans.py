@@ -0,0 +1,242 @@
+"""Checks that the statements the read endpoints execute are served by indexes.
+
+The configured database is seeded with a synthetic hierarchy of schools in a
+transaction which is rolled back at the end, so it can be run against any local
+database. The read handlers of the routers are called on the seeded data and every
+statement they execute is explained with its parameters. Sequential scans are
+disabled while planning, so the planner only falls back to one when no index can
+serve the statement; any sequential scan fails the check. So does a full index
+scan, an index read without an index condition, which the planner picks instead of a
+sequential scan, unless a limit bounds it or it's listed in `ALLOWED_FULL_SCANS`.
+
+Usage:
+    python -m benchmarks.query_plans [--schools 10] [--faculties 5]
+        [--departments 5] [--classes 4] [--students 30]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from db import engine
+from extras.exporter import FileFormat
+from routers.classes import get_classes, get_class, get_class_students
+from routers.departments import (
+    get_departments,
+    get_department,
+    download_department_data,
+)
+from routers.faculties import (
+    get_school_faculties,
+    get_school_faculty,
+    download_faculty_data,
+)
+from routers.schools import get_schools, get_school
+from utils import PageParams
+
+SCHOOL_PREFIX = "plan-check-school-"
+
+# The full index scans expected by handler, with the relations they read
+ALLOWED_FULL_SCANS = {
+    # The version of the school list aggregates every school
+    "get_schools": {"schools"},
+}
+# The nodes reading all of their input before a limit above them stops them
+BLOCKING_NODES = {"Sort", "Aggregate", "Hash"}
+
+SEED_STATEMENTS = (
+    """
+    INSERT INTO schools (id, name)
+    SELECT gen_random_uuid(), $1::text || i FROM generate_series(1, $2::int) AS i
+    """,
+    """
+    INSERT INTO faculties (id, name, school_id)
+    SELECT gen_random_uuid(), 'Faculty ' || i, schools.id
+    FROM schools, generate_series(1, $2::int) AS i
+    WHERE schools.name LIKE $1::text || '%'
+    """,
+    """
+    INSERT INTO departments (id, name, faculty_id)
+    SELECT gen_random_uuid(), 'Department ' || i, faculties.id
+    FROM schools
+    JOIN faculties ON faculties.school_id = schools.id,
+    generate_series(1, $2::int) AS i
+    WHERE schools.name LIKE $1::text || '%'
+    """,
+    """
+    INSERT INTO classes (id, display_name, level, department_id, archived)
+    SELECT gen_random_uuid(), 'Class ' || i,
+        (ARRAY['L100', 'L200', 'L300', 'L400', 'L500'])[1 + i % 5]::level,
+        departments.id, i % 4 = 0
+    FROM schools
+    JOIN faculties ON faculties.school_id = schools.id
+    JOIN departments ON departments.faculty_id = faculties.id,
+    generate_series(1, $2::int) AS i
+    WHERE schools.name LIKE $1::text || '%'
+    """,
+    """
+    INSERT INTO students (
+        id, class_id, first_name, middle_name, last_name, admission_mode,
+        matriculation_number, jamb_registration_number, personal_email_address
+    )
+    SELECT gen_random_uuid(), classes.id, 'First', 'Middle', 'Last ' || i,
+        'UTME'::admissionmode, 'MAT/' || classes.id || '/' || i,
+        'JAMB/' || classes.id || '/' || i, 'student' || i || '@example.com'
+    FROM schools
+    JOIN faculties ON faculties.school_id = schools.id
+    JOIN departments ON departments.faculty_id = faculties.id
+    JOIN classes ON classes.department_id = departments.id,
+    generate_series(1, $2::int) AS i
+    WHERE schools.name LIKE $1::text || '%'
+    """,
+)
+
+SEEDED_IDS = """
+SELECT schools.id, faculties.id, departments.id, classes.id
+FROM schools
+JOIN faculties ON faculties.school_id = schools.id
+JOIN departments ON departments.faculty_id = faculties.id
+JOIN classes ON classes.department_id = departments.id
+WHERE schools.name LIKE $1::text || '%'
+LIMIT 1
+"""
+
+
+async def seed(connection: AsyncConnection, counts: list[int]):
+    for statement, count in zip(SEED_STATEMENTS, counts):
+        await connection.exec_driver_sql(statement, (SCHOOL_PREFIX, count))
+    await connection.exec_driver_sql(
+        "ANALYZE schools, faculties, departments, classes, students"
+    )
+
+
+def get_request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+
+def get_handler_calls(school_id, faculty_id, department_id, class_id) -> dict:
+    """Provides the read handlers to check, called with a session"""
+    conditional = {"request": get_request(), "response": Response()}
+    return {
+        "get_schools": lambda db: get_schools(**conditional, page=PageParams(), db=db),
+        "get_school": lambda db: get_school(school_id=school_id, db=db),
+        "get_school_faculties": lambda db: get_school_faculties(
+            school_id=school_id, **conditional, page=PageParams(), db=db
+        ),
+        "get_school_faculty": lambda db: get_school_faculty(
+            faculty_id=faculty_id, db=db
+        ),
+        "download_faculty_data": lambda db: download_faculty_data(
+            faculty_id=faculty_id, format=FileFormat.CSV, db=db
+        ),
+        "get_departments": lambda db: get_departments(
+            faculty_id=faculty_id, **conditional, page=PageParams(), db=db
+        ),
+        "get_department": lambda db: get_department(department_id=department_id, db=db),
+        "download_department_data": lambda db: download_department_data(
+            department_id=department_id, format=FileFormat.CSV, db=db
+        ),
+        "get_classes": lambda db: get_classes(page=PageParams(), db=db),
+        "get_classes_archived": lambda db: get_classes(
+            page=PageParams(), include_archived=True, db=db
+        ),
+        "get_class": lambda db: get_class(class_id=class_id, db=db),
+        "get_class_students": lambda db: get_class_students(
+            class_id=class_id, **conditional, page=PageParams(), db=db
+        ),
+    }
+
+
+def get_full_scans(plan: dict, limited: bool = False) -> list[tuple[str, str]]:
+    """Provides the sequential scans and the full index scans not bounded by a limit
+    anywhere in a plan, as their node type and relation"""
+    node_type = plan["Node Type"]
+    relation = plan.get("Relation Name", plan.get("Index Name"))
+    scans = []
+    if node_type == "Seq Scan":
+        scans.append((node_type, relation))
+    elif "Index" in node_type and "Index Cond" not in plan and not limited:
+        scans.append((node_type, relation))
+    if node_type == "Limit":
+        limited = True
+    elif node_type in BLOCKING_NODES:
+        limited = False
+    for child in plan.get("Plans", ()):
+        scans.extend(get_full_scans(child, limited))
+    return scans
+
+
+async def check(counts: list[int]) -> list[tuple[str, str, list[str]]]:
+    """Provides the statements planned with full scans by handler"""
+    failures = []
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            await seed(connection, counts)
+            ids = (await connection.exec_driver_sql(SEEDED_IDS, (SCHOOL_PREFIX,))).one()
+            await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+            for name, call in get_handler_calls(*ids).items():
+                statements = []
+
+                def capture(conn, cursor, statement, parameters, context, many):
+                    # Leave out the savepoints of the session
+                    if statement.lstrip().upper().startswith("SELECT"):
+                        statements.append((statement, parameters))
+
+                event.listen(
+                    connection.sync_connection, "before_cursor_execute", capture
+                )
+                try:
+                    async with AsyncSession(
+                        bind=connection, join_transaction_mode="create_savepoint"
+                    ) as db:
+                        await call(db)
+                finally:
+                    event.remove(
+                        connection.sync_connection, "before_cursor_execute", capture
+                    )
+
+                for statement, parameters in statements:
+                    result = await connection.exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                    )
+                    plan = json.loads(result.scalar_one())[0]["Plan"]
+                    allowed = ALLOWED_FULL_SCANS.get(name, set())
+                    scans = [
+                        f"{node_type} on {relation}"
+                        for node_type, relation in get_full_scans(plan)
+                        if node_type == "Seq Scan" or relation not in allowed
+                    ]
+                    status = ", ".join(scans) if scans else "ok"
+                    print(f"{name:<26} {status:<30} {' '.join(statement.split())[:80]}")
+                    if scans:
+                        failures.append((name, statement, scans))
+        finally:
+            await transaction.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--schools", type=int, default=10)
+    parser.add_argument("--faculties", type=int, default=5, help="per school")
+    parser.add_argument("--departments", type=int, default=5, help="per faculty")
+    parser.add_argument("--classes", type=int, default=4, help="per department")
+    parser.add_argument("--students", type=int, default=30, help="per class")
+    args = parser.parse_args()
+
+    counts = [args.schools, args.faculties, args.departments, args.classes]
+    failures = asyncio.run(check(counts + [args.students]))
+    if failures:
+        sys.exit(f"\n{len(failures)} statement(s) planned with a full scan")
+    print("\nevery statement is served by an index")
+
+
+if __name__ == "__main__":
+    main()
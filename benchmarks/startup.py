@@ -0,0 +1,133 @@
+"""Measures the cold start of a worker: the time to import the app and to serve its
+first request.
+
+Every run is a fresh interpreter, like a gunicorn worker booting on a new instance.
+The first request is sent in process through httpx's ASGI transport, so no server
+is needed, and requests to endpoints which don't query the database don't need
+postgres either. The settings are read from `.env` or the environment as usual.
+The slowest imports are listed with `python -X importtime`.
+
+Usage:
+    python -m benchmarks.startup [--repeat 5] [--path /] [--imports 15]
+        [--output results.json] [--compare previous-results.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from benchmarks.exporters import get_revision
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Run in the child interpreter, it prints its measurements as json
+PROBE = """
+import asyncio, json, sys
+from time import perf_counter
+
+start = perf_counter()
+import main
+imported = perf_counter()
+
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        return (await client.get(sys.argv[1])).status_code
+
+status = asyncio.run(first_request())
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_request_seconds": perf_counter() - imported,
+    "status": status,
+    "loaded": sorted({"docx", "openpyxl", "orjson", "asyncpg"} & set(sys.modules)),
+}))
+"""
+
+
+def measure(path: str) -> dict:
+    start = perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, path],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode:
+        sys.exit(completed.stderr)
+    result = json.loads(completed.stdout.splitlines()[-1])
+    # Includes starting the interpreter itself
+    result["total_seconds"] = perf_counter() - start
+    return result
+
+
+def get_slowest_imports(count: int) -> list[tuple[str, int]]:
+    """Provides the top level imports of the app with the longest cumulative time"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Only the direct imports of `main` and the modules it imports
+        if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) <= 5:
+            imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def summarize(runs: list[dict]) -> dict:
+    keys = ("import_seconds", "first_request_seconds", "total_seconds")
+    return {key: round(statistics.median(run[key] for run in runs), 4) for key in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--path", default="/", help="the path of the first request")
+    parser.add_argument("--imports", type=int, default=15)
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--compare", help="json results of a previous run")
+    args = parser.parse_args()
+
+    runs = [measure(args.path) for _ in range(args.repeat)]
+    summary = summarize(runs)
+    print(f"median of {args.repeat} runs, first request GET {args.path}")
+    print(f"  import:        {summary['import_seconds']:.3f}s")
+    print(f"  first request: {summary['first_request_seconds']:.3f}s")
+    print(f"  total:         {summary['total_seconds']:.3f}s")
+    print(f"  heavy modules loaded: {', '.join(runs[-1]['loaded']) or 'none'}")
+
+    print(f"\n{'module':<40} {'cumulative (ms)':>16}")
+    for name, microseconds in get_slowest_imports(args.imports):
+        print(f"{name:<40} {microseconds / 1000:>16.1f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {"revision": get_revision(), "path": args.path, "results": summary},
+                file,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["results"]
+        print()
+        for key, value in summary.items():
+            before = previous.get(key)
+            change = f"{(value - before) / before:+.1%}" if before else "n/a"
+            print(f"{key:<22} {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
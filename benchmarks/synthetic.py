@@ -0,0 +1,48 @@
+"""Synthetic export data shared by the benchmarks"""
+
+from typing import AsyncIterator
+
+from extras.exporter import ExportData
+
+HEADERS = (
+    "First Name",
+    "Middle Name",
+    "Last Name",
+    "Admission Mode",
+    "Matriculation Number",
+    "JAMB Registration Number",
+    "Personal Email Address",
+)
+METADATA = {
+    "School": "University of Lagos",
+    "Faculty": "Engineering",
+    "Department": "Systems Engineering",
+    "Level": 300,
+    "Display Name": "Systems 300L",
+}
+
+
+def make_row(row_no: int) -> tuple:
+    return (
+        "Ada",
+        "Ngozi",
+        f"Obi {row_no}",
+        "utme",
+        f"MAT/{row_no:06}",
+        f"{row_no:08}AB",
+        f"ada.obi.{row_no}@example.com",
+    )
+
+
+def make_rows(count: int) -> list[tuple]:
+    return [make_row(row_no) for row_no in range(count)]
+
+
+async def iterate_rows(count: int) -> AsyncIterator[tuple]:
+    """Generates the rows lazily, like a server side cursor"""
+    for row_no in range(count):
+        yield make_row(row_no)
+
+
+def make_export_data(count: int) -> ExportData:
+    return ExportData(headers=HEADERS, rows=iterate_rows(count), metadata=METADATA)
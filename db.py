@@ -1,21 +1,225 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncEngine
+import asyncio
+from contextlib import nullcontext, suppress
+from dataclasses import dataclass
+from time import perf_counter
+from typing import AsyncIterator
+
+from fastapi import Request, Response
+from sqlalchemy import Select, Row
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
+
+from settings import Settings, default_settings
+
+# The number of rows fetched per round trip by server side cursors.
+STREAM_YIELD_PER = 1000
+# The maximum number of `COPY` chunks buffered between postgres and the client.
+COPY_BUFFERED_CHUNKS = 16
+# Set on the responses to writes, a client sending it back reads from the primary
+# until it expires after `READ_YOUR_WRITES_SECONDS`.
+READ_PRIMARY_COOKIE = "orderlie-read-primary"
+# Lets a client explicitly read from the primary, e.g. when it can't keep cookies
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+
+class TimedQueue(AsyncAdaptedQueue):
+    """The queue of idle connections of a pool, recording how long checkouts wait"""
+
+    checkouts = 0
+    wait_seconds = 0.0
+    max_wait_seconds = 0.0
+
+    def get(self, block: bool = True, timeout: float | None = None):
+        start = perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            waited = perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    _queue_class = TimedQueue
 
-from settings import default_settings
 
-engine = AsyncEngine(
-    create_engine(default_settings.get_database_url(), echo=True, future=True)
+@dataclass
+class PoolStats:
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    wait_seconds: float
+    max_wait_seconds: float
+
+
+def create_engine(url: str, settings: Settings = default_settings) -> AsyncEngine:
+    """Creates an engine whose connection pool is configured by the settings.
+
+    See `Settings.get_pool_limits` for the sizing of the pool of each worker.
+    """
+    pool_size, max_overflow = settings.get_pool_limits()
+    return create_async_engine(
+        url,
+        echo=settings.get_database_echo(),
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE
+        },
+    )
+
+
+def get_pool_stats(engine: AsyncEngine) -> PoolStats:
+    """Provides the live statistics of the connection pool of an engine"""
+    pool: TimedQueuePool = engine.pool
+    return PoolStats(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=max(pool.overflow(), 0),
+        checkouts=pool._pool.checkouts,
+        wait_seconds=pool._pool.wait_seconds,
+        max_wait_seconds=pool._pool.max_wait_seconds,
+    )
+
+
+engine = create_engine(default_settings.get_database_url())
+session_factory = async_sessionmaker(engine, expire_on_commit=False)
+# Every statement of a transaction reads the snapshot taken by its first statement
+snapshot_session_factory = async_sessionmaker(
+    engine.execution_options(isolation_level="REPEATABLE READ"),
+    expire_on_commit=False,
+)
+
+# Without a replica, reads are served by the primary too
+replica_url = default_settings.get_replica_database_url()
+replica_engine = (
+    create_engine(replica_url).execution_options(postgresql_readonly=True)
+    if replica_url
+    else None
+)
+replica_session_factory = (
+    async_sessionmaker(replica_engine, expire_on_commit=False)
+    if replica_engine
+    else session_factory
 )
 
 
 async def get_session_as_dependency() -> AsyncSession:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
+    async with session_factory() as session:
+        yield session
+
+
+async def get_read_session_as_dependency(request: Request) -> AsyncSession:
+    """Provides a read only session on the replica for handlers which don't write.
+
+    Clients which wrote in the last `READ_YOUR_WRITES_SECONDS`, or which send the
+    `READ_PRIMARY_HEADER`, read from the primary so they see their own writes.
+    """
+    read_primary = READ_PRIMARY_COOKIE in request.cookies or request.headers.get(
+        READ_PRIMARY_HEADER, ""
+    ).lower() in ("1", "true")
+    factory = session_factory if read_primary else replica_session_factory
+    async with factory() as session:
         yield session
 
 
+async def mark_read_your_writes(request: Request, call_next) -> Response:
+    """Sends the `READ_PRIMARY_COOKIE` with the responses to successful writes"""
+    response = await call_next(request)
+    if (
+        replica_engine is not None
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=default_settings.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
 def get_session() -> AsyncSession:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    return async_session()
+    return session_factory()
+
+
+def get_snapshot_session() -> AsyncSession:
+    return snapshot_session_factory()
+
+
+async def copy_query_to_csv(
+    statement: Select, header: bool = True, session: AsyncSession | None = None
+) -> AsyncIterator[bytes]:
+    """Streams the result of `statement` as csv using postgres' `COPY ... TO STDOUT`.
+
+    The rows are never hydrated into ORM objects, the raw csv chunks produced by
+    postgres are yielded as they arrive. At most `COPY_BUFFERED_CHUNKS` chunks are
+    held in memory, a slow client applies backpressure on the `COPY` itself.
+    Unless `session` is given, a dedicated session is used so the stream outlives
+    the request's session.
+    """
+    async with nullcontext(session) if session else get_session() as session:
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        compiled = statement.compile(dialect=connection.dialect)
+        args = [compiled.params[name] for name in compiled.positiontup]
+        chunks: asyncio.Queue[bytes | None] = asyncio.Queue(
+            maxsize=COPY_BUFFERED_CHUNKS
+        )
+
+        async def write_chunk(chunk: bytes):
+            await chunks.put(bytes(chunk))
+
+        async def copy():
+            try:
+                await raw_connection.driver_connection.copy_from_query(
+                    str(compiled),
+                    *args,
+                    output=write_chunk,
+                    format="csv",
+                    header=header,
+                )
+            except Exception:
+                await chunks.put(None)
+                raise
+            await chunks.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            # Surface any error raised by the `COPY`
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+
+
+async def stream_query(
+    statement: Select,
+    yield_per: int = STREAM_YIELD_PER,
+    session: AsyncSession | None = None,
+) -> AsyncIterator[Row]:
+    """Streams the rows of `statement` through a server side cursor.
+
+    Only `yield_per` rows are fetched from postgres at a time. Unless `session` is
+    given, a dedicated session is used so the stream outlives the request's session.
+    """
+    async with nullcontext(session) if session else get_session() as session:
+        result = await session.stream(statement.execution_options(yield_per=yield_per))
+        async for row in result:
+            yield row
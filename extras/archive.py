@@ -0,0 +1,44 @@
+from typing import AsyncIterator, IO
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from extras.exporter import EXPORT_CHUNK_SIZE
+
+
+class _ZipSink:
+    """A write-only, unseekable file collecting what a `ZipFile` writes until drained"""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        ...
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def stream_zip(
+    files: AsyncIterator[tuple[str, IO[bytes]]]
+) -> AsyncIterator[bytes]:
+    """Streams a zip archive of `files` as they arrive.
+
+    Each file is compressed in chunks of `EXPORT_CHUNK_SIZE` which are yielded straight
+    away, entries use data descriptors so neither the archive nor a whole entry is
+    ever held in memory.
+    """
+    sink = _ZipSink()
+    with ZipFile(sink, mode="w", compression=ZIP_DEFLATED) as archive:
+        async for name, file in files:
+            with archive.open(name, mode="w", force_zip64=True) as entry:
+                while chunk := file.read(EXPORT_CHUNK_SIZE):
+                    entry.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
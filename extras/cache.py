@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import suppress
+from io import BufferedReader
+from pathlib import Path
+from typing import AsyncIterator
+from uuid import UUID
+
+from extras.exporter import EXPORT_CHUNK_SIZE, FileFormat
+from settings import default_settings
+
+
+class ExportCache:
+    """A size bounded on-disk cache of rendered class exports.
+
+    The cache lives in a directory shared by all the workers of a host. Artifacts are
+    keyed by the class, the format, the class' roster version and a digest of the
+    export metadata, so a write to the roster or a rename anywhere in the breadcrumb
+    yields a new key instead of a stale artifact. Once the cache grows past `max_bytes`
+    the least recently served artifacts are evicted.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def get_key(
+        class_id: UUID, format: FileFormat, roster_version: int, metadata: dict | None
+    ) -> str:
+        digest = hashlib.sha256(
+            json.dumps(metadata, sort_keys=True, default=str).encode("utf8")
+        ).hexdigest()[:16]
+        return f"{class_id}-{roster_version}-{digest}.{format.value}"
+
+    def get(self, key: str) -> BufferedReader | None:
+        """Provides a cached artifact opened for reading and marks it as recently used.
+
+        The artifact is opened rather than located so it can still be read once it's
+        evicted, e.g. by another worker, while it's served.
+        """
+        try:
+            file = open(self.directory / key, "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(file.fileno())
+        return file
+
+    async def store(
+        self, key: str, content: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """Passes `content` through while writing it into the cache.
+
+        The artifact is only published once `content` is exhausted, an interrupted
+        download leaves nothing behind.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, partial = tempfile.mkstemp(
+            dir=self.directory, prefix=".", suffix=".partial"
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async for chunk in content:
+                    file.write(chunk)
+                    yield chunk
+            os.replace(partial, self.directory / key)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(partial)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used artifacts until the cache fits `max_bytes`"""
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(".")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self.max_bytes:
+                break
+            with suppress(FileNotFoundError):
+                os.unlink(entry.path)
+            size -= entry.stat().st_size
+
+
+async def iterate_file(file: BufferedReader) -> AsyncIterator[bytes]:
+    """Reads an open file in chunks off the event loop, and closes it"""
+    with file:
+        while chunk := await asyncio.to_thread(file.read, EXPORT_CHUNK_SIZE):
+            yield chunk
+
+
+export_cache = ExportCache(
+    directory=default_settings.EXPORT_CACHE_DIR,
+    max_bytes=default_settings.EXPORT_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from multiprocessing.managers import SyncManager
+from queue import Full
+from typing import AsyncIterator, IO
+
+from extras.exporter import (
+    AbstractExporter,
+    DocumentExporter,
+    EXPORT_CHUNK_SIZE,
+    RENDER_ABORTED,
+    RENDER_ROW_CHUNK_SIZE,
+    iterate_from_thread,
+    render_document,
+)
+from settings import ExecutorKind, default_settings
+
+# The chunks of rows queued for a render in a worker process, and how often a full
+# queue is checked for the render having stopped
+MAX_QUEUED_ROW_CHUNKS = 4
+QUEUE_POLL_SECONDS = 1
+
+
+class ExportQueueFullError(Exception):
+    """Raised when an export is submitted while the executor's queue is full"""
+
+
+class ExportExecutor:
+    """Runs the CPU-bound rendering of documents off the event loop.
+
+    At most `max_workers` documents are rendered at once and at most `max_queued`
+    more wait for a worker, any other export is rejected with `ExportQueueFullError`
+    so large downloads can't pile up and starve the other endpoints.
+
+    In a process pool the rows are sent to the worker process in chunks through a
+    bounded queue and the document comes back as a temporary file, in a thread pool
+    they're consumed by the worker as they arrive. Either way only a few chunks of
+    rows are held at once.
+    """
+
+    def __init__(self, kind: ExecutorKind, max_workers: int, max_queued: int):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.pending = 0
+        self._workers = asyncio.Semaphore(max_workers)
+        self._executor: Executor | None = None
+        self._manager: SyncManager | None = None
+
+    @property
+    def executor(self) -> Executor:
+        # Created on first use so importing the app doesn't spawn workers
+        if self._executor is None:
+            if self.kind == ExecutorKind.PROCESS:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="export"
+                )
+        return self._executor
+
+    @property
+    def manager(self) -> SyncManager:
+        # Serves the queues of rows sent to the worker processes
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    def check_capacity(self):
+        """Raises `ExportQueueFullError` when no more exports can be queued"""
+        if self.pending >= self.max_workers + self.max_queued:
+            raise ExportQueueFullError("too many exports in progress")
+
+    async def export(
+        self, exporter: AbstractExporter, wait: bool = False
+    ) -> AsyncIterator[bytes]:
+        """Renders the loaded data of the exporter and provides the chunks of the file.
+
+        Exporters that aren't `DocumentExporter`s stream their output on the event
+        loop and are returned as is.
+
+        Args:
+            exporter: the exporter with its data loaded.
+            wait: queue the export even when the queue is full. Only for callers
+                that already bound their own concurrency e.g. bulk exports.
+        """
+        if not isinstance(exporter, DocumentExporter):
+            return exporter.export()
+        if not wait:
+            self.check_capacity()
+        self.pending += 1
+        try:
+            async with self._workers:
+                file = await self._render(exporter)
+        finally:
+            self.pending -= 1
+        return self._iterate(file)
+
+    async def _render(self, exporter: DocumentExporter) -> IO[bytes]:
+        loop = asyncio.get_running_loop()
+        # Renders get plain tuples whatever the executor, e.g. rather than SQLAlchemy
+        # rows which aren't picklable nor accepted by every document library
+        rows = (tuple(row) async for row in exporter.data.rows)
+        if self.kind != ExecutorKind.PROCESS:
+            rows = iterate_from_thread(rows, loop)
+            buffer = await loop.run_in_executor(self.executor, exporter.render, rows)
+            buffer.seek(0)
+            return buffer
+
+        queue = self.manager.Queue(maxsize=MAX_QUEUED_ROW_CHUNKS)
+        render = loop.run_in_executor(
+            self.executor,
+            render_document,
+            type(exporter),
+            tuple(exporter.data.headers),
+            exporter.data.metadata,
+            queue,
+        )
+        try:
+            chunk = []
+            async for row in rows:
+                chunk.append(row)
+                if len(chunk) == RENDER_ROW_CHUNK_SIZE:
+                    await self._send(queue, chunk, render)
+                    chunk = []
+            if chunk:
+                await self._send(queue, chunk, render)
+            await self._send(queue, None, render)
+            path = await render
+        except BaseException:
+            # The render is stopped, or gives up once it stops receiving rows when
+            # its queue is full. A render which still completes leaves its file
+            # behind.
+            render.add_done_callback(self._remove_rendered_file)
+            if not render.done():
+                with suppress(Full):
+                    queue.put_nowait(RENDER_ABORTED)
+            raise
+        file = open(path, "rb")
+        os.remove(path)
+        return file
+
+    @staticmethod
+    async def _send(queue, chunk: list | None, render: asyncio.Future):
+        """Sends a chunk of rows to a render in a worker process, waiting while its
+        queue is full"""
+        while not render.done():
+            try:
+                return await asyncio.to_thread(
+                    queue.put, chunk, True, QUEUE_POLL_SECONDS
+                )
+            except Full:
+                continue
+        # The render stopped before receiving every row, raise its error
+        await render
+        raise RuntimeError("the render stopped before receiving every row")
+
+    @staticmethod
+    def _remove_rendered_file(render: asyncio.Future):
+        if not render.cancelled() and render.exception() is None:
+            with suppress(FileNotFoundError):
+                os.remove(render.result())
+
+    @staticmethod
+    async def _iterate(file: IO[bytes]) -> AsyncIterator[bytes]:
+        with file:
+            while chunk := file.read(EXPORT_CHUNK_SIZE):
+                yield chunk
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+export_executor = ExportExecutor(
+    kind=default_settings.EXPORT_EXECUTOR,
+    max_workers=default_settings.EXPORT_MAX_WORKERS,
+    max_queued=default_settings.EXPORT_MAX_QUEUED,
+)
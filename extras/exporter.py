@@ -1,13 +1,30 @@
+import asyncio
+import csv
 import json
+import tempfile
 from abc import ABC
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
-from io import BytesIO
-from tempfile import NamedTemporaryFile
-from typing import Sequence
+from functools import cache
+from importlib import import_module
+from io import StringIO, BytesIO
+from typing import Sequence, AsyncIterator, Iterator, Iterable
 
-from docx import Document
-from openpyxl.workbook import Workbook
+from extras.pdf import PDFWriter, escape_text
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The size in bytes of the chunks written into a response by the exporters
+EXPORT_CHUNK_SIZE = 64 * 1024
+# The rows sent at once to a render in another process, and how long the render waits
+# for them
+RENDER_ROW_CHUNK_SIZE = 500
+RENDER_ROW_TIMEOUT_SECONDS = 60
+# Sent instead of a chunk when the rows of a render in another process failed
+RENDER_ABORTED = "aborted"
 
 
 class FileFormat(str, Enum):
@@ -16,134 +33,326 @@ class FileFormat(str, Enum):
     PDF = "pdf"
     CSV = "csv"
     JSON = "json"
+    NDJSON = "ndjson"
 
 
 @dataclass(order=True)
 class ExportData:
     headers: Sequence
-    rows: Sequence
+    rows: AsyncIterator[Sequence] | Sequence
     metadata: dict | None
 
 
+def read_in_chunks(buffer: BytesIO) -> Iterator[bytes]:
+    """Reads a buffer in chunks of `EXPORT_CHUNK_SIZE` without copying it as a whole"""
+    with buffer.getbuffer() as view:
+        for start in range(0, len(view), EXPORT_CHUNK_SIZE):
+            yield view[start : start + EXPORT_CHUNK_SIZE].tobytes()
+
+
+def iterate_from_thread(
+    rows: AsyncIterator[Sequence], loop: asyncio.AbstractEventLoop
+) -> Iterator[Sequence]:
+    """Lets a worker thread consume async rows by fetching them on the loop"""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(anext(rows), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+def dumps(value) -> bytes:
+    """Serializes a value to json with the fastest available backend"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode("utf8")
+
+
+def format_cell(value) -> str:
+    """Provides the text of a value in an exported document"""
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+
 class AbstractExporter(ABC):
     def load_data(self, data: ExportData):
         ...
 
-    def export(self) -> BytesIO:
+    async def export(self) -> AsyncIterator[bytes]:
+        """Consumes the rows of the loaded data and yields the exported file in chunks"""
         ...
 
 
 class JSONExporter(AbstractExporter):
-    def load_data(self, data: ExportData):
-        self.data = data
+    """Exports the data as a json object of its headers, metadata and rows.
 
-    def export(self) -> BytesIO:
-        buffer = BytesIO()
-        if self.data:
-            # TODO: format accordingly
-            data = json.dumps(asdict(self.data))
-            buffer.write(data.encode("utf8"))
-        buffer.seek(0)
-        return buffer
+    The headers and metadata are written first, then the rows one at a time as they
+    arrive. `orjson` is used to serialize when it's installed.
+    """
 
-
-class CSVExporter(AbstractExporter):
     def load_data(self, data: ExportData):
         self.data = data
 
-    def export(self) -> BytesIO:
-        ...
+    def head(self) -> bytes:
+        head = dumps({"headers": self.data.headers, "metadata": self.data.metadata})
+        # Leave the object open so the rows can be written as they arrive
+        return head[:-1] + b', "rows": ['
+
+    def row(self, row: Sequence, index: int) -> bytes:
+        encoded = dumps(tuple(row))
+        return encoded if index == 0 else b", " + encoded
+
+    def tail(self) -> bytes:
+        return b"]}"
+
+    async def export(self) -> AsyncIterator[bytes]:
+        chunk = [self.head()]
+        size = len(chunk[0])
+        index = 0
+        async for row in self.data.rows:
+            encoded = self.row(row, index)
+            chunk.append(encoded)
+            size += len(encoded)
+            index += 1
+            if size >= EXPORT_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        chunk.append(self.tail())
+        yield b"".join(chunk)
+
+
+class NDJSONExporter(JSONExporter):
+    """Exports the data as newline delimited json.
+
+    The first line is an object of the headers and metadata, every other line is a row.
+    """
+
+    def head(self) -> bytes:
+        return (
+            dumps({"headers": self.data.headers, "metadata": self.data.metadata})
+            + b"\n"
+        )
 
+    def row(self, row: Sequence, index: int) -> bytes:
+        return dumps(tuple(row)) + b"\n"
+
+    def tail(self) -> bytes:
+        return b""
 
-class PDFExporter(AbstractExporter):
-    def load_data(self, data: ExportData):
-        self.data = data
 
-    def export(self) -> BytesIO:
-        with NamedTemporaryFile() as tmp:
-            # canvas = Canvas("hello.pdf")
-            # canvas.drawString(72, 72, "Hello, World!")
-            # canvas.save()
-            tmp.seek(0)
-            stream = tmp.read()
-            buffer = BytesIO(stream)
-            buffer.seek(0)
-            return buffer
+class CSVExporter(AbstractExporter):
+    """Exports the headers and rows of the data as comma separated values.
 
+    Note:
+        Class rosters are not exported through this exporter, they are streamed
+        straight out of postgres with `db.copy_query_to_csv`.
+    """
 
-class XLSXExporter(AbstractExporter):
     def load_data(self, data: ExportData):
         self.data = data
-        self.workbook = Workbook()
-        self.sheet = self.workbook.active
-        self.sheet.title = data.metadata.get("Display Name")
-
-    def export(self) -> BytesIO:
-        sheet = self.workbook.active
 
-        # Set the spreadsheet headers
-        for col_no, header in enumerate(self.data.headers, start=1):
-            self.sheet.cell(row=1, column=col_no).value = header
+    async def export(self) -> AsyncIterator[bytes]:
+        text = StringIO()
+        writer = csv.writer(text)
+        writer.writerow(self.data.headers)
+        async for row in self.data.rows:
+            writer.writerow(row)
+            if text.tell() >= EXPORT_CHUNK_SIZE:
+                yield text.getvalue().encode("utf8")
+                text.seek(0)
+                text.truncate()
+        yield text.getvalue().encode("utf8")
 
-        # Populate spreadsheet with data
-        for row_no, row_value in enumerate(self.data.rows, start=2):
-            for col_no, cell_value in enumerate(row_value, start=1):
-                self.sheet.cell(row=row_no, column=col_no).value = cell_value
 
-        with NamedTemporaryFile() as tmp:
-            self.workbook.save(tmp.name)
-            tmp.seek(0)
-            stream = tmp.read()
-            buffer = BytesIO(stream)
-            buffer.seek(0)
-            return buffer
+class DocumentExporter(AbstractExporter):
+    """An exporter whose document is rendered as a whole by a CPU-bound `render`.
 
+    `render` only consumes a plain iterable of rows so it can be run off the event
+    loop, see `extras.executor.ExportExecutor`.
+    """
 
-class DOCXExporter(AbstractExporter):
     def load_data(self, data: ExportData):
         self.data = data
-        self.document = Document()
 
-    def export(self) -> BytesIO:
-        self.document.add_heading(self.data.metadata.get("School"), 0)
-        self.document.add_paragraph(f"Faculty: {self.data.metadata.get('Faculty')}")
-        self.document.add_paragraph(
-            f"Department: {self.data.metadata.get('Department')}"
-        )
-        self.document.add_paragraph(f"Level: {self.data.metadata.get('Level')}")
+    def render(self, rows: Iterable[Sequence]) -> BytesIO:
+        ...
 
-        self.document.add_paragraph(
-            f"Display Name: {self.data.metadata.get('Display Name')}"
-        )
-        table = self.document.add_table(rows=1, cols=len(self.data.headers))
+    async def export(self) -> AsyncIterator[bytes]:
+        """Renders the document in a thread consuming the rows as they arrive.
 
-        # set table headers
-        for cell, header in zip(table.rows[0].cells, self.data.headers):
-            cell.text = header
+        Prefer `extras.executor.export_executor`, which bounds the concurrent renders.
+        """
+        rows = self.data.rows
+        if isinstance(rows, AsyncIterator):
+            rows = iterate_from_thread(rows, asyncio.get_running_loop())
+        for chunk in read_in_chunks(await asyncio.to_thread(self.render, rows)):
+            yield chunk
 
-        # Populate table with data
-        for row_value in self.data.rows:
-            row_cells = table.add_row().cells
-            for col_no, cell_value in enumerate(row_value):
-                row_cells[col_no].text = str(cell_value)
 
-        with NamedTemporaryFile() as tmp:
-            self.document.save(tmp.name)
-            tmp.seek(0)
-            stream = tmp.read()
-            buffer = BytesIO(stream)
-            buffer.seek(0)
-            return buffer
+class PDFExporter(AbstractExporter):
+    """Exports the data as a table on landscape A4 pages.
+
+    Pages are generated and yielded as soon as they're filled with rows, so the
+    document is never held in memory. The table is set in Courier, whose glyphs are
+    all 0.6em wide, so cells are fitted to their column by character count.
+
+    Note:
+        Courier is a standard font, it isn't embedded and only covers cp1252. Letters
+        outside it, e.g. the Yoruba `ọ`, `ẹ` and `ṣ`, are set without their
+        diacritics, see `extras.pdf.encode_win_ansi`. Export to docx or xlsx to keep
+        them.
+    """
+
+    PAGE_WIDTH, PAGE_HEIGHT = 842, 595
+    MARGIN = 36
+    FONT_SIZE = 8
+    LINE_HEIGHT = 11
+    # The width of a table line in characters and the gap between its columns
+    LINE_LENGTH = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+    COLUMN_GAP = 2
+    FONTS = ("Helvetica", "Helvetica-Bold", "Courier", "Courier-Bold")
+    METADATA_FIELDS = ("Faculty", "Department", "Level", "Display Name")
 
+    def load_data(self, data: ExportData):
+        self.data = data
+        # Share the line between the columns in proportion to their header's length
+        available = self.LINE_LENGTH - self.COLUMN_GAP * (len(data.headers) - 1)
+        total = sum(len(header) for header in data.headers)
+        self.column_widths = [
+            available * len(header) // total for header in data.headers
+        ]
+
+    def text(self, font: int, size: int, x: float, y: float, text: str) -> bytes:
+        return b"BT /F%d %d Tf %g %g Td %s Tj ET\n" % (
+            font,
+            size,
+            x,
+            y,
+            escape_text(text),
+        )
 
-def get_exporter_class(format: FileFormat) -> AbstractExporter:
-    return {
-        FileFormat.JSON: JSONExporter(),
-        FileFormat.CSV: CSVExporter(),
-        FileFormat.PDF: PDFExporter(),
-        FileFormat.EXCEL: XLSXExporter(),
-        FileFormat.DOCUMENT: DOCXExporter(),
-    }[format]
+    def table_line(self, font: int, y: float, values: Sequence) -> bytes:
+        line = []
+        for width, value in zip(self.column_widths, values):
+            cell = format_cell(value)
+            if len(cell) > width:
+                cell = f"{cell[:width - 1]}~"
+            line.append(cell.ljust(width))
+        text = (" " * self.COLUMN_GAP).join(line).rstrip()
+        return self.text(font, self.FONT_SIZE, self.MARGIN, y, text)
+
+    def table_top(self, page_no: int) -> float:
+        top = self.PAGE_HEIGHT - self.MARGIN - self.LINE_HEIGHT
+        if page_no == 1:
+            # Leave room for the title and metadata
+            top -= 24 + 14 * len(self.METADATA_FIELDS)
+        return top
+
+    def page_capacity(self, page_no: int) -> int:
+        bottom = self.MARGIN + 2 * self.LINE_HEIGHT
+        return int((self.table_top(page_no) - bottom) // self.LINE_HEIGHT)
+
+    def page(self, page_no: int, rows: Sequence[Sequence]) -> bytes:
+        content = []
+        if page_no == 1:
+            y = self.PAGE_HEIGHT - self.MARGIN - 16
+            metadata = self.data.metadata
+            content.append(
+                self.text(2, 16, self.MARGIN, y, format_cell(metadata.get("School")))
+            )
+            for field in self.METADATA_FIELDS:
+                y -= 14
+                value = format_cell(metadata.get(field))
+                content.append(self.text(1, 10, self.MARGIN, y, f"{field}: {value}"))
+        y = self.table_top(page_no)
+        content.append(self.table_line(4, y, self.data.headers))
+        for row in rows:
+            y -= self.LINE_HEIGHT
+            content.append(self.table_line(3, y, row))
+        content.append(self.text(1, 8, self.MARGIN, self.MARGIN, f"Page {page_no}"))
+        return b"".join(content)
+
+    async def export(self) -> AsyncIterator[bytes]:
+        writer = PDFWriter(self.PAGE_WIDTH, self.PAGE_HEIGHT, self.FONTS)
+        yield writer.begin()
+        page_no, rows = 1, []
+        async for row in self.data.rows:
+            rows.append(row)
+            if len(rows) == self.page_capacity(page_no):
+                yield writer.add_page(self.page(page_no, rows))
+                page_no, rows = page_no + 1, []
+        if rows or page_no == 1:
+            yield writer.add_page(self.page(page_no, rows))
+        yield writer.end()
+
+
+def read_row_chunks(queue) -> Iterator[Sequence]:
+    """Reads the chunks of rows sent to a render in another process until a `None`.
+
+    Raises:
+        queue.Empty: when no chunk arrives for `RENDER_ROW_TIMEOUT_SECONDS`, e.g. as
+            the export was cancelled.
+        RuntimeError: when the sender aborts the render.
+    """
+    while (chunk := queue.get(timeout=RENDER_ROW_TIMEOUT_SECONDS)) is not None:
+        if chunk == RENDER_ABORTED:
+            raise RuntimeError("the rows of the render failed")
+        yield from chunk
+
+
+def render_document(
+    exporter_class: type[DocumentExporter], headers: Sequence, metadata: dict, queue
+) -> str:
+    """Renders export data with a new exporter into a temporary file, provides its path.
+
+    This is the entrypoint of renders in a separate process, where neither the
+    loaded exporter nor the async rows can be sent. The rows arrive in chunks through
+    `queue`, see `read_row_chunks`, and the document is left in a file the caller
+    removes rather than sent back.
+    """
+    data = ExportData(headers=headers, rows=read_row_chunks(queue), metadata=metadata)
+    exporter = exporter_class()
+    exporter.load_data(data)
+    buffer = exporter.render(data.rows)
+    with tempfile.NamedTemporaryFile(prefix="orderlie-render-", delete=False) as file:
+        file.write(buffer.getbuffer())
+    return file.name
+
+
+# The exporter of every format. Exporters depending on heavy libraries are given as
+# the "module:class" path they are imported from on first use, so a worker only
+# pays for importing `docx` or `openpyxl` when it renders such a document.
+EXPORTERS: dict[FileFormat, type[AbstractExporter] | str] = {
+    FileFormat.JSON: JSONExporter,
+    FileFormat.NDJSON: NDJSONExporter,
+    FileFormat.CSV: CSVExporter,
+    FileFormat.PDF: PDFExporter,
+    FileFormat.EXCEL: "extras.spreadsheet:XLSXExporter",
+    FileFormat.DOCUMENT: "extras.word:DOCXExporter",
+}
+
+
+def register_exporter(format: FileFormat, exporter: type[AbstractExporter] | str):
+    """Sets the exporter of a format, either as a class or a "module:class" path"""
+    EXPORTERS[format] = exporter
+    get_exporter_class.cache_clear()
+
+
+@cache
+def get_exporter_class(format: FileFormat) -> type[AbstractExporter]:
+    """Provides the exporter class of a format, importing it on first use"""
+    exporter = EXPORTERS[format]
+    if isinstance(exporter, str):
+        module, _, name = exporter.partition(":")
+        exporter = getattr(import_module(module), name)
+    return exporter
+
+
+def get_exporter(format: FileFormat) -> AbstractExporter:
+    return get_exporter_class(format)()
 
 
 def get_media_type(format: FileFormat) -> str:
@@ -153,4 +362,5 @@ def get_media_type(format: FileFormat) -> str:
         FileFormat.PDF: "application/pdf",
         FileFormat.CSV: "text/csv",
         FileFormat.JSON: "text/json",
+        FileFormat.NDJSON: "application/x-ndjson",
     }[format]
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from importlib import import_module
+from typing import Any, Awaitable, Callable, Sequence
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from extras.instrumentation import log
+from settings import Settings, default_settings
+
+# The namespaces of the cached responses
+HIERARCHY_NAMESPACES = ("schools", "faculties", "departments")
+# The channel invalidations are notified on, every worker listens to it
+INVALIDATION_CHANNEL = "orderlie_hierarchy_cache"
+# How long the listener waits before reconnecting after losing its connection
+LISTENER_RETRY_SECONDS = 5
+
+
+class CacheBackend(ABC):
+    """The storage of a hierarchy cache.
+
+    Keys are strings prefixed by their namespace, e.g. `schools:...`, and values are
+    json compatible. A backend shared by the workers, e.g. one on redis, sets `shared`
+    so the workers don't need to notify each other of invalidations.
+    """
+
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    async def invalidate(self, namespaces: Sequence[str]):
+        """Drops every key of the namespaces"""
+        ...
+
+
+class MemoryBackend(CacheBackend):
+    """A cache in the worker's memory evicting entries past their ttl, or the least
+    recently used entries past `max_entries`"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, namespaces: Sequence[str]):
+        prefixes = tuple(f"{namespace}:" for namespace in namespaces)
+        for key in [key for key in self._entries if key.startswith(prefixes)]:
+            del self._entries[key]
+
+
+class HierarchyCache:
+    """A read-through cache of the responses of the school / faculty / department
+    endpoints, which are rarely written.
+
+    Writes invalidate the namespaces they affect in the worker and notify the other
+    workers through postgres, which drop them from their own backends. A load racing
+    an invalidation isn't stored, so a stale response can't outlive the write.
+
+    Loads must read the primary, a replica lagging behind the write would have its
+    stale rows cached until the next invalidation or the ttl.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._generations: dict[str, int] = {}
+
+    @staticmethod
+    def get_key(namespace: str, *parts) -> str:
+        return ":".join((namespace, *(str(part) for part in parts)))
+
+    async def get_or_load(
+        self, namespace: str, parts: Sequence, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Provides the cached value of a key, loading and caching it when missing"""
+        key = self.get_key(namespace, *parts)
+        value = await self.backend.get(key)
+        if value is not None:
+            return value
+        generation = self._generations.get(namespace, 0)
+        value = jsonable_encoder(await load())
+        if self._generations.get(namespace, 0) == generation:
+            await self.backend.set(key, value)
+        return value
+
+    async def invalidate_locally(self, namespaces: Sequence[str]):
+        for namespace in namespaces:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        await self.backend.invalidate(namespaces)
+
+    async def invalidate(self, db: AsyncSession, *namespaces: str):
+        """Invalidates namespaces in every worker, call it once the write is committed"""
+        await self.invalidate_locally(namespaces)
+        if not self.backend.shared:
+            await db.execute(
+                select(func.pg_notify(INVALIDATION_CHANNEL, ",".join(namespaces)))
+            )
+            await db.commit()
+
+    async def listen(self, dsn: str):
+        """Applies the invalidations notified by the other workers until cancelled.
+
+        A dedicated connection is used so the pool isn't short of one. Notifications
+        sent while it's disconnected are lost, so everything is invalidated whenever
+        it (re)connects.
+        """
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except (OSError, asyncpg.PostgresError) as e:
+                log(logging.WARNING, "hierarchy_cache_listener_error", error=str(e))
+                await asyncio.sleep(LISTENER_RETRY_SECONDS)
+                continue
+            # The payloads of the notifications, `None` once the connection is lost
+            payloads: asyncio.Queue[str | None] = asyncio.Queue()
+            try:
+                connection.add_termination_listener(lambda _: payloads.put_nowait(None))
+                await connection.add_listener(
+                    INVALIDATION_CHANNEL, lambda *args: payloads.put_nowait(args[-1])
+                )
+                await self.invalidate_locally(HIERARCHY_NAMESPACES)
+                while (payload := await payloads.get()) is not None:
+                    await self.invalidate_locally(payload.split(","))
+                log(logging.WARNING, "hierarchy_cache_listener_disconnected")
+            finally:
+                await connection.close()
+
+
+def get_backend(settings: Settings) -> CacheBackend:
+    """Provides the configured backend, a `module:Class` path of a backend class
+    constructed with the settings, or the in-memory one"""
+    if settings.HIERARCHY_CACHE_BACKEND is None:
+        return MemoryBackend(
+            ttl_seconds=settings.HIERARCHY_CACHE_TTL_SECONDS,
+            max_entries=settings.HIERARCHY_CACHE_MAX_ENTRIES,
+        )
+    module, _, name = settings.HIERARCHY_CACHE_BACKEND.partition(":")
+    return getattr(import_module(module), name)(settings)
+
+
+hierarchy_cache = HierarchyCache(get_backend(default_settings))
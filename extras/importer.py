@@ -0,0 +1,134 @@
+import csv
+from dataclasses import dataclass, field
+from io import TextIOWrapper
+from typing import IO, Iterator, Sequence
+
+from pydantic import BaseModel, ValidationError
+
+from extras.exporter import FileFormat
+
+# The number of valid rows inserted per statement
+IMPORT_BATCH_SIZE = 1000
+# The largest file accepted, it's spooled to disk past `IMPORT_SPOOL_BYTES`
+IMPORT_MAX_BYTES = 16 * 1024 * 1024
+IMPORT_SPOOL_BYTES = 1024 * 1024
+IMPORT_FORMATS = (FileFormat.CSV, FileFormat.EXCEL)
+
+
+class ImportFileError(ValueError):
+    ...
+
+
+@dataclass
+class RowError:
+    # The row's number in the file, its first row is row 1
+    row: int
+    errors: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class ValidatedBatch:
+    # The validated rows keyed by their row number
+    rows: dict[int, BaseModel]
+    errors: list[RowError]
+
+
+def read_csv(file: IO[bytes]) -> Iterator[Sequence]:
+    yield from csv.reader(TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+
+
+def read_xlsx(file: IO[bytes]) -> Iterator[Sequence]:
+    """Reads the rows of the first sheet of a workbook without loading it as a whole"""
+    # Only imported when a spreadsheet is imported, see `extras.exporter.EXPORTERS`
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"the file is not a valid xlsx workbook: {e}")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(file: IO[bytes], format: FileFormat) -> Iterator[Sequence]:
+    if format == FileFormat.CSV:
+        return read_csv(file)
+    if format == FileFormat.EXCEL:
+        return read_xlsx(file)
+    raise ImportFileError(f"{format.value} files can't be imported")
+
+
+def get_field_name(header) -> str:
+    """Provides the schema field of a header, e.g. `"First Name"` is `first_name`.
+
+    The headers of exported rosters are accepted so an export can be imported back.
+    """
+    return "_".join(str(header or "").strip().lower().split())
+
+
+def get_cell_text(value) -> str:
+    # Spreadsheet numbers, e.g. registration numbers typed as numbers, are read as
+    # text as they're written
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+def validate_rows(
+    rows: Iterator[Sequence],
+    schema: type[BaseModel],
+    defaults: dict,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Iterator[ValidatedBatch]:
+    """Validates the rows of a file against a schema in batches as they are read.
+
+    The headers are the first row naming a field of the schema, the rows above them,
+    e.g. the metadata block of an exported spreadsheet, are skipped. Empty cells are
+    read as nulls, and fully empty rows are skipped.
+
+    Raises:
+        ImportFileError: when the file can't be decoded or has no header row.
+    """
+    try:
+        numbered_rows = enumerate(rows, start=1)
+        for _, row in numbered_rows:
+            headers = [get_field_name(header) for header in row]
+            if schema.model_fields.keys() & set(headers):
+                break
+        else:
+            raise ImportFileError("the file has no header row")
+
+        batch = ValidatedBatch({}, [])
+        for row_no, row in numbered_rows:
+            values = {
+                header: get_cell_text(value) or None if value is not None else None
+                for header, value in zip(headers, row)
+                if header
+            }
+            if not any(values.values()):
+                continue
+            try:
+                batch.rows[row_no] = schema(**{**values, **defaults})
+            except ValidationError as e:
+                batch.errors.append(
+                    RowError(
+                        row_no,
+                        [
+                            {
+                                "field": ".".join(str(loc) for loc in error["loc"]),
+                                "message": error["msg"],
+                            }
+                            for error in e.errors()
+                        ],
+                    )
+                )
+            if len(batch.rows) == batch_size:
+                yield batch
+                batch = ValidatedBatch({}, [])
+        yield batch
+    except UnicodeDecodeError:
+        raise ImportFileError("csv files must be utf-8 encoded")
+    except csv.Error as e:
+        raise ImportFileError(f"the file is not a valid csv file: {e}")
@@ -0,0 +1,164 @@
+import json
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from time import perf_counter
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db import get_pool_stats
+from settings import AppMode, default_settings
+
+# Statistics are logged as json lines on stderr, gunicorn forwards it with
+# `--log-file -`. The logger doesn't propagate so echoed statements aren't repeated.
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+logger.propagate = False
+
+# The length statements are truncated to in logs
+LOGGED_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class QueryStats:
+    """The statements executed while serving a request"""
+
+    count: int = 0
+    seconds: float = 0
+    slow: list[tuple[str, float]] = field(default_factory=list)
+    # The number of times each statement was executed, regardless of its parameters
+    shapes: Counter = field(default_factory=Counter)
+
+    def get_repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Provides the statements executed more than `threshold` times"""
+        return [
+            (statement, count)
+            for statement, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+# The engines whose pools are reported in the request logs, by name
+instrumented_engines: dict[str, AsyncEngine] = {}
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def get_shape(statement: str) -> str:
+    # Statements are compiled with placeholders, only the whitespace varies
+    return " ".join(statement.split())[:LOGGED_STATEMENT_LENGTH]
+
+
+def log(level: int, name: str, **fields):
+    logger.log(level, json.dumps({"event": name, **fields}, default=str))
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append((context, perf_counter()))
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, start = conn.info["query_start"].pop()
+    seconds = perf_counter() - start
+    stats = current_query_stats.get()
+    shape = get_shape(statement)
+    if stats is None:
+        # Executed outside of a request, e.g. by an export job
+        if seconds >= default_settings.SLOW_QUERY_SECONDS:
+            log(
+                logging.WARNING,
+                "slow_query",
+                statement=shape,
+                seconds=round(seconds, 4),
+            )
+        return
+    stats.count += 1
+    stats.seconds += seconds
+    stats.shapes[shape] += 1
+    if seconds >= default_settings.SLOW_QUERY_SECONDS:
+        stats.slow.append((shape, seconds))
+
+
+def handle_error(context):
+    # A failed statement doesn't reach `after_cursor_execute`, its start is dropped so
+    # the connection's next statements aren't timed from it. Statements failing before
+    # `before_cursor_execute` didn't push one.
+    if context.connection is None or context.execution_context is None:
+        return
+    starts = context.connection.info.get("query_start")
+    if starts and starts[-1][0] is context.execution_context:
+        starts.pop()
+
+
+def instrument_engine(engine: AsyncEngine, name: str = "primary"):
+    """Records the statements executed through an engine in the current request, and
+    reports its pool in the request logs under `name`"""
+    instrumented_engines[name] = engine
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
+
+
+async def record_queries(request: Request, call_next) -> Response:
+    """Collects the statistics of the statements a request executes.
+
+    In development they're sent in the response headers, in production they're
+    logged with the statistics of the worker's connection pools. Slow statements
+    and statements repeated more than `QUERY_REPEAT_THRESHOLD` times, usually lazy
+    loads in a loop, are logged as warnings in both modes. Only statements executed
+    before the response starts are counted, streamed exports use their own
+    sessions.
+    """
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        current_query_stats.reset(token)
+
+    request_fields = {"method": request.method, "path": request.url.path}
+    for statement, seconds in stats.slow:
+        log(
+            logging.WARNING,
+            "slow_query",
+            **request_fields,
+            statement=statement,
+            seconds=round(seconds, 4),
+        )
+    for statement, count in stats.get_repeated(default_settings.QUERY_REPEAT_THRESHOLD):
+        log(
+            logging.WARNING,
+            "repeated_query",
+            **request_fields,
+            statement=statement,
+            count=count,
+        )
+
+    milliseconds = stats.seconds * 1000
+    if default_settings.APP_MODE == AppMode.DEVELOPMENT:
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Slow-Query-Count"] = str(len(stats.slow))
+        response.headers[
+            "Server-Timing"
+        ] = f'db;dur={milliseconds:.1f};desc="{stats.count} queries"'
+    else:
+        log(
+            logging.INFO,
+            "request_queries",
+            **request_fields,
+            status=response.status_code,
+            queries=stats.count,
+            db_milliseconds=round(milliseconds, 1),
+            slow_queries=len(stats.slow),
+            pools={
+                name: asdict(get_pool_stats(engine))
+                for name, engine in instrumented_engines.items()
+            },
+        )
+    return response
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass, asdict
+from enum import Enum
+from io import BufferedReader
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+from uuid import UUID
+
+from extras.executor import ExportQueueFullError
+from extras.exporter import FileFormat
+from settings import default_settings
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class ExportJob:
+    id: UUID
+    format: FileFormat
+    status: JobStatus
+    created_at: float
+    updated_at: float
+    # The number of bytes of the export written so far
+    progress: int = 0
+    error: str | None = None
+    # The pid of the worker running the job
+    owner: int | None = None
+
+
+# Provides an opened cached export or a stream of the export, see
+# `utils.get_class_export`
+ExportRun = Callable[[], Awaitable[BufferedReader | AsyncIterator[bytes]]]
+
+
+class ExportJobQueue:
+    """Runs exports in the background and keeps their results on disk.
+
+    Jobs run on the event loop of the worker that accepted them, at most
+    `max_concurrent` at once and `max_queued` more waiting. Their state is stored as
+    json next to their result in `directory`, so any worker of the host can report on
+    a job and serve its result. Jobs older than `retention_seconds` are removed, as are
+    the oldest jobs once more than `max_stored` are kept.
+
+    A job left queued or running by a worker that's gone, e.g. killed by a deploy or
+    the OOM killer, is marked failed when it's read and when a worker starts.
+    """
+
+    # The minimum number of bytes written between two saves of a job's progress
+    PROGRESS_INTERVAL = 1024 * 1024
+
+    def __init__(
+        self,
+        directory: Path,
+        max_concurrent: int,
+        max_queued: int,
+        retention_seconds: int,
+        max_stored: int,
+    ):
+        self.directory = directory
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.max_stored = max_stored
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks: set[asyncio.Task] = set()
+        # The ids of the jobs this worker is running or has queued
+        self._job_ids: set[UUID] = set()
+
+    def submit(self, run: ExportRun, format: FileFormat) -> ExportJob:
+        """Queues an export job.
+
+        Raises:
+            ExportQueueFullError: when this worker already has too many jobs.
+        """
+        if len(self._tasks) >= self.max_concurrent + self.max_queued:
+            raise ExportQueueFullError("too many export jobs in progress")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prune()
+        now = time.time()
+        job = ExportJob(
+            id=uuid.uuid4(),
+            format=format,
+            status=JobStatus.QUEUED,
+            created_at=now,
+            updated_at=now,
+            owner=os.getpid(),
+        )
+        self._save(job)
+        self._job_ids.add(job.id)
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, id: UUID) -> ExportJob | None:
+        try:
+            with open(self._state_path(id)) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        job = ExportJob(
+            **{
+                **state,
+                "id": UUID(state["id"]),
+                "format": FileFormat(state["format"]),
+                "status": JobStatus(state["status"]),
+            }
+        )
+        if self._is_orphaned(job):
+            self._update(job, status=JobStatus.FAILED, error="export interrupted")
+        return job
+
+    def get_result(self, job: ExportJob) -> Path | None:
+        if job.status != JobStatus.SUCCEEDED:
+            return None
+        path = self._result_path(job.id)
+        return path if path.exists() else None
+
+    def prune(self):
+        """Removes expired jobs and the oldest ones past `max_stored`"""
+        states = sorted(
+            self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime
+        )
+        expired_before = time.time() - self.retention_seconds
+        excess = len(states) - self.max_stored
+        for index, path in enumerate(states):
+            if index >= excess and path.stat().st_mtime >= expired_before:
+                break
+            with suppress(FileNotFoundError):
+                self._result_path(UUID(path.stem)).unlink()
+            with suppress(FileNotFoundError):
+                path.unlink()
+
+    def recover(self):
+        """Marks failed the jobs whose worker is gone, call it when a worker starts.
+
+        Jobs owned by the pid of the starting worker are failed too, they were left by
+        a previous process whose pid was reused, e.g. after a container restart.
+        """
+        for path in self.directory.glob("*.json"):
+            with suppress(FileNotFoundError, ValueError):
+                self.get(UUID(path.stem))
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job: ExportJob, run: ExportRun):
+        try:
+            async with self._slots:
+                self._update(job, status=JobStatus.RUNNING)
+                export = await run()
+                if isinstance(export, BufferedReader):
+                    await asyncio.to_thread(self._link_result, job, export)
+                else:
+                    await self._write_result(job, export)
+                self._update(job, status=JobStatus.SUCCEEDED)
+        except asyncio.CancelledError:
+            self._update(job, status=JobStatus.FAILED, error="export interrupted")
+            raise
+        except Exception as error:
+            self._update(job, status=JobStatus.FAILED, error=str(error))
+        finally:
+            self._job_ids.discard(job.id)
+
+    def _link_result(self, job: ExportJob, cached: BufferedReader):
+        # The cached export may be evicted, hard link it to keep it alive, or copy the
+        # opened file once it's gone
+        with cached:
+            try:
+                os.link(cached.name, self._result_path(job.id))
+            except OSError:
+                with open(self._result_path(job.id), "wb") as file:
+                    shutil.copyfileobj(cached, file)
+        job.progress = self._result_path(job.id).stat().st_size
+
+    async def _write_result(self, job: ExportJob, content: AsyncIterator[bytes]):
+        fd, partial = tempfile.mkstemp(
+            dir=self.directory, prefix=".", suffix=".partial"
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                saved = 0
+                async for chunk in content:
+                    file.write(chunk)
+                    job.progress += len(chunk)
+                    if job.progress - saved >= self.PROGRESS_INTERVAL:
+                        saved = job.progress
+                        self._update(job)
+            os.replace(partial, self._result_path(job.id))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(partial)
+            raise
+
+    def _is_orphaned(self, job: ExportJob) -> bool:
+        """Whether an unfinished job is no longer run by any worker"""
+        if job.status not in (JobStatus.QUEUED, JobStatus.RUNNING):
+            return False
+        if job.owner == os.getpid():
+            return job.id not in self._job_ids
+        if job.owner is None:
+            return True
+        try:
+            os.kill(job.owner, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            # The process exists but belongs to another user
+            pass
+        return False
+
+    def _update(self, job: ExportJob, **changes):
+        for key, value in changes.items():
+            setattr(job, key, value)
+        job.updated_at = time.time()
+        self._save(job)
+
+    def _save(self, job: ExportJob):
+        state = {**asdict(job), "id": str(job.id)}
+        fd, partial = tempfile.mkstemp(
+            dir=self.directory, prefix=".", suffix=".partial"
+        )
+        with os.fdopen(fd, "w") as file:
+            json.dump(state, file)
+        os.replace(partial, self._state_path(job.id))
+
+    def _state_path(self, id: UUID) -> Path:
+        return self.directory / f"{id}.json"
+
+    def _result_path(self, id: UUID) -> Path:
+        return self.directory / f"{id}.result"
+
+
+export_job_queue = ExportJobQueue(
+    directory=default_settings.EXPORT_JOBS_DIR,
+    max_concurrent=default_settings.EXPORT_JOBS_MAX_CONCURRENT,
+    max_queued=default_settings.EXPORT_JOBS_MAX_QUEUED,
+    retention_seconds=default_settings.EXPORT_JOBS_RETENTION_SECONDS,
+    max_stored=default_settings.EXPORT_JOBS_MAX_STORED,
+)
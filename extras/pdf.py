@@ -0,0 +1,126 @@
+import unicodedata
+import zlib
+from typing import Sequence
+
+
+def encode_win_ansi(text: str) -> bytes:
+    """Encodes text for the standard fonts, whose WinAnsi encoding is cp1252's.
+
+    Letters missing from it are set without their diacritics, e.g. the Yoruba `ọ` and
+    `Ṣ` as `o` and `S`, and any other missing character as `?`.
+    """
+    try:
+        return text.encode("cp1252")
+    except UnicodeEncodeError:
+        pass
+    encoded = bytearray()
+    for char in unicodedata.normalize("NFC", text):
+        try:
+            encoded += char.encode("cp1252")
+        except UnicodeEncodeError:
+            base = "".join(
+                part
+                for part in unicodedata.normalize("NFD", char)
+                if not unicodedata.combining(part)
+            )
+            encoded += base.encode("cp1252", errors="replace")
+    return bytes(encoded)
+
+
+def escape_text(text: str) -> bytes:
+    """Encodes text as a PDF string literal for the standard (WinAnsi) fonts"""
+    encoded = encode_win_ansi(text)
+    return (
+        b"("
+        + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        + b")"
+    )
+
+
+class PDFWriter:
+    """Writes a PDF document one page at a time.
+
+    Every object is serialized as soon as it's added and only its offset is kept, so
+    pages can be flushed as they're generated. The page tree is written last since
+    it has to list every page. Only the standard fonts are available, they are not
+    embedded.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, width: float, height: float, fonts: Sequence[str]):
+        self.width = width
+        self.height = height
+        self.fonts = fonts
+        self.offset = 0
+        self.offsets: dict[int, int] = {}
+        self.pages: list[int] = []
+        self._next_number = self.PAGES + 1
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        data = b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        self.offsets[number] = self.offset
+        self.offset += len(data)
+        return data
+
+    def _new_object(self, body: bytes) -> tuple[int, bytes]:
+        number = self._next_number
+        self._next_number += 1
+        return number, self._object(number, body)
+
+    def _write(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def begin(self) -> bytes:
+        output = [self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")]
+        output.append(
+            self._object(
+                self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES
+            )
+        )
+        font_refs = []
+        for index, font in enumerate(self.fonts, start=1):
+            number, data = self._new_object(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+                b"/Encoding /WinAnsiEncoding >>" % font.encode("ascii")
+            )
+            output.append(data)
+            font_refs.append(b"/F%d %d 0 R" % (index, number))
+        self.resources = b"<< /Font << %s >> >>" % b" ".join(font_refs)
+        return b"".join(output)
+
+    def add_page(self, content: bytes) -> bytes:
+        """Adds a page drawn by the `content` operators and provides its serialization"""
+        stream = zlib.compress(content)
+        content_number, content_data = self._new_object(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+            % (len(stream), stream)
+        )
+        page_number, page_data = self._new_object(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %g %g] "
+            b"/Resources %s /Contents %d 0 R >>"
+            % (self.PAGES, self.width, self.height, self.resources, content_number)
+        )
+        self.pages.append(page_number)
+        return content_data + page_data
+
+    def end(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        output = [
+            self._object(
+                self.PAGES,
+                b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)),
+            )
+        ]
+        xref_offset = self.offset
+        size = self._next_number
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for number in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.offsets[number])
+        output.extend(xref)
+        output.append(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (size, self.CATALOG, xref_offset)
+        )
+        return b"".join(output)
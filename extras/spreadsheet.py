@@ -0,0 +1,48 @@
+from io import BytesIO
+from typing import Iterable, Sequence
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.workbook import Workbook
+
+from extras.exporter import DocumentExporter, ExportData
+
+
+class XLSXExporter(DocumentExporter):
+    """Exports the data into a spreadsheet.
+
+    The workbook is opened in write-only mode, rows are serialized as they are
+    appended instead of being held as cells. Memory grows with the compressed
+    workbook rather than with the rows, as long as the rows are streamed into
+    `render`, see `extras.executor.ExportExecutor`.
+    """
+
+    METADATA_FIELDS = ("School", "Faculty", "Department", "Level")
+
+    def load_data(self, data: ExportData):
+        self.data = data
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title=data.metadata.get("Display Name"))
+
+    def bold(self, value) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self.sheet, value=value)
+        cell.font = Font(bold=True)
+        return cell
+
+    def render(self, rows: Iterable[Sequence]) -> BytesIO:
+        # Set the metadata block above the table
+        for field in self.METADATA_FIELDS:
+            self.sheet.append((self.bold(field), self.data.metadata.get(field)))
+        self.sheet.append(())
+
+        # Set the spreadsheet headers
+        self.sheet.append(self.bold(header) for header in self.data.headers)
+
+        # Populate spreadsheet with data as it arrives
+        for row_value in rows:
+            self.sheet.append(tuple(row_value))
+
+        # Render straight into memory, the buffer is only sliced into the response
+        buffer = BytesIO()
+        self.workbook.save(buffer)
+        return buffer
@@ -0,0 +1,77 @@
+import re
+from io import BytesIO
+from typing import Iterable, Sequence
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from extras.exporter import DocumentExporter, ExportData, format_cell
+
+# Control characters which can't be written into an xml document
+INVALID_XML_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class DOCXExporter(DocumentExporter):
+    """Exports the data as a table in a word document.
+
+    The table rows are generated as WordprocessingML and appended in batches of
+    `ROW_BATCH_SIZE`, so rendering is linear in the number of rows.
+    """
+
+    ROW_BATCH_SIZE = 500
+
+    def load_data(self, data: ExportData):
+        self.data = data
+        self.document = Document()
+
+    @staticmethod
+    def table_row(widths: Sequence[int], values: Sequence) -> str:
+        cells = []
+        for width, value in zip(widths, values):
+            text = escape(INVALID_XML_CHARACTERS.sub("", format_cell(value)))
+            cells.append(
+                f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+                f'<w:p><w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p></w:tc>'
+            )
+        return f"<w:tr>{''.join(cells)}</w:tr>"
+
+    @staticmethod
+    def extend_table(table, rows: Sequence[str]):
+        if rows:
+            fragment = parse_xml(f"<w:tbl {nsdecls('w')}>{''.join(rows)}</w:tbl>")
+            table._tbl.extend(fragment)
+
+    def render(self, rows: Iterable[Sequence]) -> BytesIO:
+        self.document.add_heading(self.data.metadata.get("School"), 0)
+        self.document.add_paragraph(f"Faculty: {self.data.metadata.get('Faculty')}")
+        self.document.add_paragraph(
+            f"Department: {self.data.metadata.get('Department')}"
+        )
+        self.document.add_paragraph(f"Level: {self.data.metadata.get('Level')}")
+
+        self.document.add_paragraph(
+            f"Display Name: {self.data.metadata.get('Display Name')}"
+        )
+        table = self.document.add_table(rows=1, cols=len(self.data.headers))
+
+        # set table headers
+        for cell, header in zip(table.rows[0].cells, self.data.headers):
+            cell.text = header
+
+        # Populate table with data as it arrives. `table.add_row().cells` walks the
+        # whole table on every row, so the rows are written as xml in batches instead
+        widths = [grid_col.w.twips for grid_col in table._tbl.tblGrid.gridCol_lst]
+        batch = []
+        for row_value in rows:
+            batch.append(self.table_row(widths, row_value))
+            if len(batch) == self.ROW_BATCH_SIZE:
+                self.extend_table(table, batch)
+                batch = []
+        self.extend_table(table, batch)
+
+        # Render straight into memory, the buffer is only sliced into the response
+        buffer = BytesIO()
+        self.document.save(buffer)
+        return buffer
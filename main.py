@@ -1,13 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 
-from routers import school_router, faculty_router, department_router, class_router
+from db import mark_read_your_writes, engine, replica_engine
+from extras.executor import export_executor
+from extras.hierarchy_cache import hierarchy_cache
+from extras.instrumentation import instrument_engine, record_queries
+from extras.jobs import export_job_queue
+from routers import (
+    school_router,
+    faculty_router,
+    department_router,
+    class_router,
+    job_router,
+)
 from routers.students import student_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = None
+    if not hierarchy_cache.backend.shared:
+        dsn = engine.url.set(drivername="postgresql")
+        listener = asyncio.create_task(
+            hierarchy_cache.listen(dsn.render_as_string(hide_password=False))
+        )
+    export_job_queue.recover()
+    yield
+    if listener is not None:
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+    await export_job_queue.shutdown()
+    export_executor.shutdown()
+
+
 app = FastAPI(
     title="Orderlie API",
     description="Collect, organize and & export class biodata",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -18,6 +52,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.middleware("http")(mark_read_your_writes)
+app.middleware("http")(record_queries)
+
+instrument_engine(engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine, "replica")
+
 VERSION_PREFIX = "/api/v1"
 
 app.include_router(school_router, prefix=VERSION_PREFIX)
@@ -25,6 +66,7 @@ app.include_router(faculty_router, prefix=VERSION_PREFIX)
 app.include_router(department_router, prefix=VERSION_PREFIX)
 app.include_router(class_router, prefix=VERSION_PREFIX)
 app.include_router(student_router, prefix=VERSION_PREFIX)
+app.include_router(job_router, prefix=VERSION_PREFIX)
 
 
 @app.get("/")
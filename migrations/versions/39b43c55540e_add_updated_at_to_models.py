@@ -0,0 +1,32 @@
+"""add updated_at to models
+
+Revision ID: 39b43c55540e
+Revises: 81ccb75a3f02
+Create Date: 2026-10-18 00:27:09.641385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '39b43c55540e'
+down_revision: Union[str, None] = '81ccb75a3f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('schools', 'faculties', 'departments', 'classes', 'students')
+
+
+def upgrade() -> None:
+    # now() isn't volatile, so the existing rows get the migration's time without the
+    # tables being rewritten
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,41 @@
+"""index foreign keys with ids for keyset pagination
+
+Revision ID: 7a91b19eb53c
+Revises: d7627a933e62
+Create Date: 2026-10-17 22:03:18.504917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a91b19eb53c'
+down_revision: Union[str, None] = 'd7627a933e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The foreign key indexes are replaced by indexes on the foreign key and the id, they
+# still serve lookups by the foreign key and also serve its pages ordered by id
+INDEXES = (
+    ('faculties', 'school_id'),
+    ('departments', 'faculty_id'),
+    ('classes', 'department_id'),
+    ('students', 'class_id'),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, column in INDEXES:
+            op.create_index(f'ix_{table}_{column}_id', table, [column, 'id'], unique=False, postgresql_concurrently=True)
+            op.drop_index(f'ix_{table}_{column}', table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, column in INDEXES:
+            op.create_index(f'ix_{table}_{column}', table, [column], unique=False, postgresql_concurrently=True)
+            op.drop_index(f'ix_{table}_{column}_id', table_name=table, postgresql_concurrently=True)
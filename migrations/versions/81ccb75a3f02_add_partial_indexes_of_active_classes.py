@@ -0,0 +1,30 @@
+"""add partial indexes of active classes
+
+Revision ID: 81ccb75a3f02
+Revises: 7a91b19eb53c
+Create Date: 2026-10-17 23:41:52.307614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81ccb75a3f02'
+down_revision: Union[str, None] = '7a91b19eb53c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_classes_department_id_id_active', 'classes', ['department_id', 'id'], unique=False, postgresql_where=sa.text('NOT archived'), postgresql_concurrently=True)
+        op.create_index('ix_classes_id_active', 'classes', ['id'], unique=False, postgresql_where=sa.text('NOT archived'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_classes_id_active', table_name='classes', postgresql_concurrently=True)
+        op.drop_index('ix_classes_department_id_id_active', table_name='classes', postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""add foreign key and lookup indexes
+
+Revision ID: d7627a933e62
+Revises: 4c1e9b7d2a10
+Create Date: 2026-10-17 21:12:40.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7627a933e62'
+down_revision: Union[str, None] = '4c1e9b7d2a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Indexes are built concurrently so writes aren't blocked, which can't be done
+    # in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_faculties_school_id'), 'faculties', ['school_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_departments_faculty_id'), 'departments', ['faculty_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_classes_department_id'), 'classes', ['department_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_students_class_id'), 'students', ['class_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_students_matriculation_number', 'students', ['matriculation_number'], unique=False, postgresql_where=sa.text('matriculation_number IS NOT NULL'), postgresql_concurrently=True)
+        op.create_index('ix_students_jamb_registration_number', 'students', ['jamb_registration_number'], unique=False, postgresql_where=sa.text('jamb_registration_number IS NOT NULL'), postgresql_concurrently=True)
+        op.create_index('uq_students_class_id_matriculation_number', 'students', ['class_id', 'matriculation_number'], unique=True, postgresql_where=sa.text('matriculation_number IS NOT NULL'), postgresql_concurrently=True)
+        op.create_index('uq_students_class_id_jamb_registration_number', 'students', ['class_id', 'jamb_registration_number'], unique=True, postgresql_where=sa.text('jamb_registration_number IS NOT NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_students_class_id_jamb_registration_number', table_name='students', postgresql_concurrently=True)
+        op.drop_index('uq_students_class_id_matriculation_number', table_name='students', postgresql_concurrently=True)
+        op.drop_index('ix_students_jamb_registration_number', table_name='students', postgresql_concurrently=True)
+        op.drop_index('ix_students_matriculation_number', table_name='students', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_students_class_id'), table_name='students', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_classes_department_id'), table_name='classes', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_departments_faculty_id'), table_name='departments', postgresql_concurrently=True)
+        op.drop_index(op.f('ix_faculties_school_id'), table_name='faculties', postgresql_concurrently=True)
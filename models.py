@@ -1,47 +1,236 @@
 import uuid
-from typing import cast, TypeVar
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from dataclasses import dataclass
+from datetime import datetime
+from typing import cast, TypeVar, Sequence, Generic
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, select, delete
+from sqlalchemy import (
+    DateTime,
+    String,
+    case,
+    ForeignKey,
+    Index,
+    func,
+    select,
+    delete,
+    update,
+    not_,
+    Select,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncAttrs
 from sqlalchemy.orm import (
     mapped_column,
     Mapped,
     relationship,
     DeclarativeBase,
+    joinedload,
+    selectinload,
 )
+from sqlalchemy.orm.interfaces import LoaderOption
+from sqlalchemy.sql.elements import ColumnElement
 
+from db import stream_query
 from extras.exporter import ExportData
 from schemas import Level, AdmissionMode
+from settings import default_settings
 
 M = TypeVar("M")
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursorError(ValueError):
+    ...
+
+
+@dataclass
+class Page(Generic[M]):
+    items: list[M]
+    # Provides the next page when passed back to `paginate`, `None` on the last page
+    next_cursor: str | None
+
+
+@dataclass
+class BulkCreateResult(Generic[M]):
+    # The created objects in the order of their data
+    items: list[M]
+    # The rows which weren't created as their `index` in the data and the `message`
+    # of their error
+    errors: list[dict]
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     ...
 
 
 class ModelMixin:
-    # TODO: Implement a generic way to perform updates
+    # Set on every insert and update, versions the responses serving the object
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    @classmethod
+    def get_version_query(cls, where: Sequence[ColumnElement[bool]] = ()) -> Select:
+        """Provides a query of the number of objects matching `where` and when the last
+        of them was updated, which changes whenever one of them is written"""
+        return select(func.count(cls.id), func.max(cls.updated_at)).where(*where)
+
+    @classmethod
+    def get_load_options(cls, load: Sequence[str]) -> list[LoaderOption]:
+        """Provides the options to eagerly load relationships in the same round trip.
+
+        Args:
+            load: dotted paths of relationships to load e.g. `"department.faculty.school"`.
+                Many-to-one relationships are joined into the query while collections
+                are fetched with a single `SELECT ... IN` per path segment.
+        """
+        options = []
+        for path in load:
+            model, option = cls, None
+            for name in path.split("."):
+                attribute = getattr(model, name)
+                loader = selectinload if attribute.property.uselist else joinedload
+                option = (
+                    loader(attribute)
+                    if option is None
+                    else getattr(option, loader.__name__)(attribute)
+                )
+                model = attribute.property.mapper.class_
+            options.append(option)
+        return options
+
     @classmethod
     async def create(cls, db: AsyncSession, data: dict) -> M:
-        obj = cls(**data)
-        db.add(obj)
+        """Inserts an object and provides it as inserted in a single statement"""
+        query = insert(cls).values(**data).returning(cls)
+        obj = (await db.execute(query)).scalar_one()
         await db.commit()
-        await db.refresh(obj)
         return obj
 
     @classmethod
-    async def all(cls, db: AsyncSession) -> list[M]:
+    async def insert_many(cls, db: AsyncSession, data: Sequence[dict]) -> list[M]:
+        """Inserts objects with multi-row inserts as part of the current transaction"""
+        query = insert(cls).returning(cls, sort_by_parameter_order=True)
+        return list((await db.execute(query, list(data))).scalars())
+
+    @classmethod
+    async def bulk_create(
+        cls,
+        db: AsyncSession,
+        data: Sequence[dict],
+        atomic: bool = True,
+        chunk_size: int = default_settings.BULK_CREATE_CHUNK_SIZE,
+    ) -> BulkCreateResult[M]:
+        """Inserts objects `chunk_size` rows per statement and commits them at once.
+
+        When `atomic` is set either every object is created or the `IntegrityError`
+        of the first failing chunk is raised. Otherwise each chunk is inserted in a
+        savepoint, the rows of a failing chunk are retried one by one and the rows
+        which still fail are reported.
+
+        Raises:
+            IntegrityError: when a row violates a constraint and `atomic` is set.
+        """
+        result: BulkCreateResult[M] = BulkCreateResult([], [])
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start : start + chunk_size]
+            if atomic:
+                result.items.extend(await cls.insert_many(db, chunk))
+                continue
+            try:
+                async with db.begin_nested():
+                    result.items.extend(await cls.insert_many(db, chunk))
+            except IntegrityError:
+                for index, row in enumerate(chunk, start=start):
+                    try:
+                        async with db.begin_nested():
+                            result.items.extend(await cls.insert_many(db, [row]))
+                    except IntegrityError as e:
+                        result.errors.append({"index": index, "message": str(e.orig)})
+        await db.commit()
+        return result
+
+    @classmethod
+    async def update(cls, db: AsyncSession, id: UUID, data: dict) -> M | None:
+        """Updates an object and provides it as updated in a single statement.
+
+        `None` is returned when there's no object with the id, so a missing object
+        doesn't need to be fetched first.
+        """
+        if not data:
+            return await cls.get_by_id(db, id)
+        query = (
+            update(cls)
+            .where(cls.id == id)
+            .values(**data)
+            .returning(cls)
+            .execution_options(populate_existing=True)
+        )
+        obj = (await db.execute(query)).scalar_one_or_none()
+        if obj:
+            await db.commit()
+        return obj
+
+    @classmethod
+    async def all(cls, db: AsyncSession, load: Sequence[str] = ()) -> list[M]:
         objs: list[M] = []
-        query = select(cls)
+        query = select(cls).options(*cls.get_load_options(load))
         objs = cast(list[Base], (await db.execute(query)).scalars())
         return objs
 
+    @staticmethod
+    def encode_cursor(id: UUID) -> str:
+        return urlsafe_b64encode(id.bytes).rstrip(b"=").decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> UUID:
+        try:
+            return UUID(bytes=urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (Base64Error, ValueError):
+            raise InvalidCursorError(f"invalid cursor {cursor!r}")
+
+    @classmethod
+    async def paginate(
+        cls,
+        db: AsyncSession,
+        cursor: str | None = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        where: Sequence[ColumnElement[bool]] = (),
+        load: Sequence[str] = (),
+    ) -> Page[M]:
+        """Provides a page of the objects matching `where` ordered by their ids.
+
+        Pages are fetched by keyset, the cursor encodes the id of the last object of
+        the previous page, so a page is a range scan of an index on the filtered
+        columns and the id however deep it is.
+
+        Raises:
+            InvalidCursorError: when the cursor wasn't provided by a previous page.
+        """
+        limit = min(limit, MAX_PAGE_SIZE)
+        query = select(cls).where(*where)
+        if cursor is not None:
+            query = query.where(cls.id > cls.decode_cursor(cursor))
+        query = (
+            query.order_by(cls.id).limit(limit + 1).options(*cls.get_load_options(load))
+        )
+        objs = list((await db.execute(query)).scalars())
+        # The extra object tells if there's a next page without another round trip
+        if len(objs) > limit:
+            return Page(objs[:limit], cls.encode_cursor(objs[limit - 1].id))
+        return Page(objs, None)
+
     @classmethod
-    async def get_by_id(cls, db: AsyncSession, id: UUID) -> M | None:
+    async def get_by_id(
+        cls, db: AsyncSession, id: UUID, load: Sequence[str] = ()
+    ) -> M | None:
         obj: M | None = None
-        query = select(cls).where(cls.id == id)
+        query = select(cls).where(cls.id == id).options(*cls.get_load_options(load))
         obj = (await db.execute(query)).scalar_one_or_none()
         return obj
 
@@ -49,6 +238,7 @@ class ModelMixin:
     async def delete(cls, db: AsyncSession, id: UUID):
         query = delete(cls).where(cls.id == id)
         await db.execute(query)
+        await db.commit()
 
 
 class School(ModelMixin, Base):
@@ -61,6 +251,8 @@ class School(ModelMixin, Base):
 
 class Faculty(ModelMixin, Base):
     __tablename__ = "faculties"
+    # Pages of a school's faculties are range scans of this index
+    __table_args__ = (Index("ix_faculties_school_id_id", "school_id", "id"),)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     name: Mapped[
@@ -73,6 +265,8 @@ class Faculty(ModelMixin, Base):
 
 class Department(ModelMixin, Base):
     __tablename__ = "departments"
+    # Pages of a faculty's departments are range scans of this index
+    __table_args__ = (Index("ix_departments_faculty_id_id", "faculty_id", "id"),)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column()
@@ -82,6 +276,19 @@ class Department(ModelMixin, Base):
 
 class Class(ModelMixin, Base):
     __tablename__ = "classes"
+    __table_args__ = (
+        # Pages of a department's classes are range scans of this index
+        Index("ix_classes_department_id_id", "department_id", "id"),
+        # Archived classes pile up year after year, reads of the active classes only
+        # scan these indexes
+        Index(
+            "ix_classes_department_id_id_active",
+            "department_id",
+            "id",
+            postgresql_where="NOT archived",
+        ),
+        Index("ix_classes_id_active", "id", postgresql_where="NOT archived"),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     display_name: Mapped[str | None] = mapped_column()
@@ -92,53 +299,112 @@ class Class(ModelMixin, Base):
     deputy_id: Mapped[UUID | None] = mapped_column()
     students: Mapped[list["Student"]] = relationship()
     archived: Mapped[bool] = mapped_column(default=False)
+    # Bumped on every write to the class or its students, keys cached exports
+    roster_version: Mapped[int] = mapped_column(default=0, server_default="0")
+
+    EXPORT_RELATIONSHIPS = ("department.faculty.school",)
+
+    @classmethod
+    def get_archived_filter(
+        cls, include_archived: bool = False
+    ) -> tuple[ColumnElement[bool], ...]:
+        """Provides the `where` clauses leaving archived classes out, unless included.
+
+        The clause matches the predicate of the partial indexes of active classes.
+        """
+        return () if include_archived else (not_(cls.archived),)
+
+    @classmethod
+    async def all(
+        cls, db: AsyncSession, load: Sequence[str] = (), include_archived: bool = False
+    ) -> list[M]:
+        query = (
+            select(cls)
+            .where(*cls.get_archived_filter(include_archived))
+            .options(*cls.get_load_options(load))
+        )
+        return list((await db.execute(query)).scalars())
+
+    @classmethod
+    async def bump_roster_version(cls, db: AsyncSession, id: UUID):
+        """Bumps the roster version of a class as part of the current transaction"""
+        query = (
+            update(cls)
+            .where(cls.id == id)
+            .values(roster_version=cls.roster_version + 1)
+        )
+        await db.execute(query)
+
+    @classmethod
+    async def update(cls, db: AsyncSession, id: UUID, data: dict) -> M | None:
+        return await super().update(
+            db, id, {**data, "roster_version": cls.roster_version + 1}
+        )
+
+    def get_roster_query(self) -> Select:
+        """Provides a query of the class' students export columns labelled by their headers"""
+        return select(
+            *(column.label(header) for header, column in STUDENT_EXPORT_COLUMNS.items())
+        ).where(Student.class_id == self.id)
+
+    async def get_export_data(self, session: AsyncSession | None = None) -> ExportData:
+        """Provides the class' export data, its rows are streamed when iterated, in
+        `session` when it's given.
 
-    async def get_export_data(self) -> ExportData:
-        rows = [
-            (
-                student.first_name,
-                student.middle_name,
-                student.last_name,
-                student.admission_mode,
-                student.matriculation_number,
-                student.jamb_registration_number,
-                student.personal_email_address,
-            )
-            for student in await self.awaitable_attrs.students
-        ]
+        Load the class with `EXPORT_RELATIONSHIPS` to avoid a round trip per level of
+        its school / faculty / department breadcrumb.
+        """
         return ExportData(
-            headers=(
-                "First Name",
-                "Middle Name",
-                "Last Name",
-                "Admission Mode",
-                "Matriculation Number",
-                "JAMB Registration Number",
-                "Personal Email Address",
-            ),
-            rows=rows,
-            metadata={
-                "Display Name": self.display_name,
-                "Level": self.level,
-                "Department": (await self.awaitable_attrs.department).name,
-                "Faculty": (
-                    await (
-                        await self.awaitable_attrs.department
-                    ).awaitable_attrs.faculty
-                ).name,
-                "School": (
-                    await (
-                        await (
-                            await self.awaitable_attrs.department
-                        ).awaitable_attrs.faculty
-                    ).awaitable_attrs.school
-                ).name,
-            },
+            headers=tuple(STUDENT_EXPORT_COLUMNS),
+            rows=stream_query(self.get_roster_query(), session=session),
+            metadata=await self.get_export_metadata(),
         )
 
+    async def get_export_metadata(self) -> dict:
+        """Provides the class' breadcrumb shown above its exported roster"""
+        department = await self.awaitable_attrs.department
+        faculty = await department.awaitable_attrs.faculty
+        school = await faculty.awaitable_attrs.school
+        return {
+            "Display Name": self.display_name,
+            "Level": self.level,
+            "Department": department.name,
+            "Faculty": faculty.name,
+            "School": school.name,
+        }
+
 
 class Student(ModelMixin, Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Pages of a class' students are range scans of this index
+        Index("ix_students_class_id_id", "class_id", "id"),
+        Index(
+            "ix_students_matriculation_number",
+            "matriculation_number",
+            postgresql_where="matriculation_number IS NOT NULL",
+        ),
+        Index(
+            "ix_students_jamb_registration_number",
+            "jamb_registration_number",
+            postgresql_where="jamb_registration_number IS NOT NULL",
+        ),
+        # A registration number may only appear once on a class' roster
+        Index(
+            "uq_students_class_id_matriculation_number",
+            "class_id",
+            "matriculation_number",
+            unique=True,
+            postgresql_where="matriculation_number IS NOT NULL",
+        ),
+        Index(
+            "uq_students_class_id_jamb_registration_number",
+            "class_id",
+            "jamb_registration_number",
+            unique=True,
+            postgresql_where="jamb_registration_number IS NOT NULL",
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     class_id: Mapped[UUID] = mapped_column(ForeignKey("classes.id"))
@@ -149,3 +415,58 @@ class Student(ModelMixin, Base):
     matriculation_number: Mapped[str | None] = mapped_column(nullable=True)
     jamb_registration_number: Mapped[str | None] = mapped_column(nullable=True)
     personal_email_address: Mapped[str] = mapped_column()
+
+    @classmethod
+    async def create(cls, db: AsyncSession, data: dict) -> M:
+        await Class.bump_roster_version(db, data["class_id"])
+        return await super().create(db, data)
+
+    @classmethod
+    async def bulk_create(
+        cls, db: AsyncSession, data: Sequence[dict], **kwargs
+    ) -> BulkCreateResult[M]:
+        class_ids = {row["class_id"] for row in data}
+        query = (
+            update(Class)
+            .where(Class.id.in_(class_ids))
+            .values(roster_version=Class.roster_version + 1)
+        )
+        await db.execute(query)
+        return await super().bulk_create(db, data, **kwargs)
+
+    @classmethod
+    async def import_many(cls, db: AsyncSession, data: Sequence[dict]) -> set[UUID]:
+        """Inserts students with multi-row inserts as part of the current transaction.
+
+        Students whose registration numbers are already on their class' roster are
+        skipped. The ids must be set in `data`, the ids of the inserted students are
+        returned.
+        """
+        if not data:
+            return set()
+        query = insert(cls).on_conflict_do_nothing().returning(cls.id)
+        return set((await db.execute(query, list(data))).scalars())
+
+    @classmethod
+    async def delete(cls, db: AsyncSession, id: UUID):
+        query = delete(cls).where(cls.id == id).returning(cls.class_id)
+        class_id = (await db.execute(query)).scalar_one_or_none()
+        if class_id:
+            await Class.bump_roster_version(db, class_id)
+        await db.commit()
+
+
+# The columns of a student exported in a class roster keyed by their headers
+STUDENT_EXPORT_COLUMNS = {
+    "First Name": Student.first_name,
+    "Middle Name": Student.middle_name,
+    "Last Name": Student.last_name,
+    # Postgres stores the names of the members, the exports show their values
+    "Admission Mode": case(
+        {mode.name: mode.value for mode in AdmissionMode},
+        value=Student.admission_mode.cast(String),
+    ),
+    "Matriculation Number": Student.matriculation_number,
+    "JAMB Registration Number": Student.jamb_registration_number,
+    "Personal Email Address": Student.personal_email_address,
+}
@@ -2,4 +2,5 @@ from .classes import class_router
 from .classes import class_router
 from .departments import department_router
 from .faculties import faculty_router
+from .jobs import job_router
 from .schools import school_router
@@ -1,19 +1,40 @@
+import os
+from dataclasses import asdict
+from io import BufferedReader
+from typing import cast
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_session_as_dependency
-from extras.exporter import FileFormat, get_exporter_class, get_media_type
-from models import Class
+from db import get_session_as_dependency, get_read_session_as_dependency
+from extras.cache import iterate_file
+from extras.executor import ExportQueueFullError
+from extras.exporter import FileFormat, get_media_type
+from extras.importer import ImportFileError, IMPORT_FORMATS
+from extras.jobs import export_job_queue
+from models import Class, Student
 from schemas import (
     CreateClassSchema,
     UpdateClassSchema,
     ClassSchema,
     StudentSchema,
     ResponseSchema,
+    ExportJobSchema,
+)
+from utils import (
+    get_model_by_id_or_404,
+    update_model_by_id_or_404,
+    get_class_export,
+    paginate_or_400,
+    PageParams,
+    spool_request_body,
+    import_class_students,
+    bulk_create_or_409,
+    check_not_modified,
 )
 
 class_router = APIRouter(prefix="/classes", tags=["classes"])
@@ -36,24 +57,58 @@ async def create_class(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.detail)
 
 
+@class_router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_classes(
+    classes_data: list[CreateClassSchema],
+    atomic: bool = True,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you create many classes at once, e.g. every level of a
+    department.
+
+    If a class can't be created none of them are and the error is returned. Pass
+    `atomic=false` to keep the classes that could be created, the others are listed
+    in `errors` by their position in the request.
+    """
+    result = await bulk_create_or_409(db, Class, classes_data, atomic)
+    return ResponseSchema(
+        message=f"{len(result.items)} classes successfully created",
+        data={
+            "classes": [
+                ClassSchema(**class_.__dict__).model_dump() for class_ in result.items
+            ],
+            "errors": result.errors,
+        },
+    )
+
+
 @class_router.get("")
 async def get_classes(
-    db: AsyncSession = Depends(get_session_as_dependency),
+    page: PageParams = Depends(),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_session_as_dependency),
 ) -> ResponseSchema:
-    """This endpoint lets you retrieve classes on the platform"""
-    # TODO: Pagination
+    """This endpoint lets you retrieve classes on the platform.
+
+    Classes are paginated, pass the returned `next_cursor` as the `cursor` to get the
+    next page. `next_cursor` is `null` on the last page. Archived classes are left out
+    unless `include_archived` is set.
+    """
+    class_page = await paginate_or_400(
+        db, Class, page, where=Class.get_archived_filter(include_archived)
+    )
     classes = [
-        ClassSchema(**class_.__dict__).model_dump() for class_ in await Class.all(db)
+        ClassSchema(**class_.__dict__).model_dump() for class_ in class_page.items
     ]
     return ResponseSchema(
         message="classes successfully retrieved",
-        data={"classes": classes},
+        data={"classes": classes, "next_cursor": class_page.next_cursor},
     )
 
 
 @class_router.get("/{class_id}")
 async def get_class(
-    class_id: UUID, db: AsyncSession = Depends(get_session_as_dependency)
+    class_id: UUID, db: AsyncSession = Depends(get_read_session_as_dependency)
 ) -> ResponseSchema:
     """This endpoint lets you retrieve a class by it's unique identifier"""
     class_ = await Class.get_by_id(db, class_id)
@@ -65,40 +120,79 @@ async def get_class(
 
 @class_router.get("/{class_id}/students")
 async def get_class_students(
-    class_id: UUID, db: AsyncSession = Depends(get_session_as_dependency)
+    class_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_session_as_dependency),
 ) -> ResponseSchema:
-    """This endpoint lets you retrieve the student members of a class"""
-    class_ = await Class.get_by_id(db, class_id)
+    """This endpoint lets you retrieve the student members of a class.
+
+    Students are paginated, pass the returned `next_cursor` as the `cursor` to get the
+    next page. `next_cursor` is `null` on the last page. Send the returned `ETag` as
+    `If-None-Match` to get a 304 when the students are unchanged.
+    """
+    query = select(Class.roster_version).where(Class.id == class_id)
+    roster_version = (await db.execute(query)).scalar_one_or_none()
+    if roster_version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Class with id {class_id} not found",
+        )
+    check_not_modified(request, response, (roster_version,))
+    student_page = await paginate_or_400(
+        db, Student, page, where=(Student.class_id == class_id,)
+    )
     students = [
-        StudentSchema(**student.__dict__).model_dump()
-        for student in await class_.awaitable_attrs.students
+        StudentSchema(**student.__dict__).model_dump() for student in student_page.items
     ]
     return ResponseSchema(
         message="students successfully retrieved",
-        data={"students": students},
+        data={"students": students, "next_cursor": student_page.next_cursor},
     )
 
 
-@class_router.patch("/{class_id}")
-async def partial_update_class(
+@class_router.post("/{class_id}/students/import")
+async def import_class_students_file(
     class_id: UUID,
-    class_data: UpdateClassSchema,
+    request: Request,
+    format: FileFormat = FileFormat.CSV,
     db: AsyncSession = Depends(get_session_as_dependency),
 ) -> ResponseSchema:
-    """The endpoint lets you perform a partial update on a class information"""
-    class_to_update = await Class.get_by_id(db, class_id)
+    """This endpoint lets you add the students of a csv or xlsx roster to a class.
 
-    if not class_to_update:
+    Send the file as the request body. The first row holds the headers, either the
+    student fields (e.g. `first_name`) or the headers of an exported roster (e.g.
+    `First Name`). Valid rows are imported and invalid rows are reported by their row
+    number in `errors`, with the header as row 1.
+    """
+    if format not in IMPORT_FORMATS:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Class not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{format.value} files can't be imported",
         )
+    await get_model_by_id_or_404(db, Class, class_id)
+    with await spool_request_body(request) as file:
+        try:
+            imported, errors = await import_class_students(db, class_id, file, format)
+        except ImportFileError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ResponseSchema(
+        message=f"{imported} students successfully imported",
+        data={"imported": imported, "errors": [asdict(error) for error in errors]},
+    )
 
-    for key, value in class_data.model_dump().items():
-        setattr(class_to_update, key, value)
 
-    db.add(class_to_update)
-    await db.commit()
-    await db.refresh(class_to_update)
+@class_router.patch("/{class_id}")
+async def partial_update_class(
+    class_id: UUID,
+    class_data: UpdateClassSchema,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """The endpoint lets you perform a partial update on a class information"""
+    class_to_update = await update_model_by_id_or_404(
+        db, Class, class_id, class_data.model_dump()
+    )
 
     return ResponseSchema(
         message="Class successfully updated",
@@ -114,13 +208,71 @@ async def download_class_data(
 ):
     """This endpoint lets you download the class data in the desired format.
 
-    Note: This endpoint has not been implemented yet
+    The class' students are exported with its school, faculty and department, the
+    file is streamed as it's rendered and served from the export cache while the
+    class is unchanged.
+    """
+    class_ = cast(
+        Class,
+        (
+            await get_model_by_id_or_404(
+                db, Class, class_id, load=Class.EXPORT_RELATIONSHIPS
+            )
+        ),
+    )
+    # The export reads in its own session, the request's connection is released
+    # rather than held until the file is sent
+    await db.close()
+    try:
+        export = await get_class_export(class_, format)
+    except ExportQueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, try again later",
+        )
+    if isinstance(export, BufferedReader):
+        return StreamingResponse(
+            iterate_file(export),
+            media_type=get_media_type(format),
+            headers={"Content-Length": str(os.fstat(export.fileno()).st_size)},
+        )
+    return StreamingResponse(export, media_type=get_media_type(format))
+
+
+@class_router.post("/{class_id}/export-jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_class_export_job(
+    class_id: UUID,
+    format: FileFormat = FileFormat.DOCUMENT,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you export the class data in the background.
+
+    Poll the returned job with `GET /export-jobs/{job_id}` and download the file
+    with `GET /export-jobs/{job_id}/download` once it has succeeded.
     """
-    class_: Class = await Class.get_by_id(db, class_id)
-    data = await class_.get_export_data()
-    exporter = get_exporter_class(format)
-    exporter.load_data(data)
-    return StreamingResponse(exporter.export(), media_type=get_media_type(format))
+    class_ = cast(
+        Class,
+        (
+            await get_model_by_id_or_404(
+                db, Class, class_id, load=Class.EXPORT_RELATIONSHIPS
+            )
+        ),
+    )
+    # The job reads in its own session once it runs
+    await db.close()
+    try:
+        job = export_job_queue.submit(
+            lambda: get_class_export(class_, format, wait=True), format
+        )
+    except ExportQueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, try again later",
+        )
+    return ResponseSchema(
+        message="export job successfully created",
+        data={"job": ExportJobSchema(**asdict(job)).model_dump()},
+    )
 
 
 @class_router.post("/{class_id}/archive")
@@ -154,5 +306,16 @@ async def archive_class(
 async def delete_class(
     class_id: UUID, db: AsyncSession = Depends(get_session_as_dependency)
 ):
-    """This endpoint let's you delete a class."""
-    await Class.delete(db, class_id)
+    """This endpoint let's you delete a class.
+
+    A class which still has students can't be deleted, archive it instead.
+    """
+    try:
+        await Class.delete(db, class_id)
+    except IntegrityError as e:
+        if "students_class_id_fkey" in str(e.orig):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"class with id {class_id} still has students",
+            )
+        raise
@@ -1,14 +1,25 @@
 from typing import cast
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_session_as_dependency
-from models import Department, Faculty
+from db import get_session_as_dependency, get_read_session_as_dependency
+from extras.hierarchy_cache import hierarchy_cache
+from extras.exporter import FileFormat
+from models import Department, Faculty, Class
 from schemas import DepartmentSchema, ResponseSchema, CreateUpdateDepartmentSchema
-from utils import get_one_model_obj_by_query_or_404
+from utils import (
+    get_one_model_obj_by_query_or_404,
+    get_model_by_id_or_404,
+    paginate_or_400,
+    PageParams,
+    get_classes_archive_response,
+    bulk_create_or_409,
+    get_version,
+    check_not_modified,
+)
 
 department_router = APIRouter(prefix="/{faculty_id}/departments", tags=["departments"])
 
@@ -16,25 +27,48 @@ department_router = APIRouter(prefix="/{faculty_id}/departments", tags=["departm
 @department_router.get("")
 async def get_departments(
     faculty_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
     db: AsyncSession = Depends(get_session_as_dependency),
 ) -> ResponseSchema:
-    """This endpoint lets you retrieve all the departments a faculty has"""
-    query = select(Faculty).where(Faculty.id == faculty_id)
-    faculty = cast(
-        Faculty,
-        (
-            await get_one_model_obj_by_query_or_404(
-                db=db, statement=query, resource_name="faculty"
-            )
-        ),
+    """This endpoint lets you retrieve all the departments a faculty has.
+
+    Departments are paginated, pass the returned `next_cursor` as the `cursor` to get
+    the next page. `next_cursor` is `null` on the last page. Send the returned `ETag`
+    as `If-None-Match` to get a 304 when the departments are unchanged.
+    """
+
+    async def load_version() -> list:
+        # An unknown faculty isn't cached, ids sent by clients would fill the cache
+        await get_model_by_id_or_404(db, Faculty, faculty_id)
+        return await get_version(
+            db, Department.get_version_query((Department.faculty_id == faculty_id,))
+        )
+
+    version = await hierarchy_cache.get_or_load(
+        "departments", (faculty_id, "version"), load_version
     )
-    departments = [
-        DepartmentSchema(**department.__dict__).model_dump()
-        for department in (await faculty.awaitable_attrs.departments)
-    ]
+    check_not_modified(request, response, version)
+
+    async def load() -> dict:
+        department_page = await paginate_or_400(
+            db, Department, page, where=(Department.faculty_id == faculty_id,)
+        )
+        departments = [
+            DepartmentSchema(**department.__dict__).model_dump()
+            for department in department_page.items
+        ]
+        return {
+            "departments": departments,
+            "next_cursor": department_page.next_cursor,
+        }
+
     return ResponseSchema(
         message="departments successfully retrieved",
-        data={"departments": departments},
+        data=await hierarchy_cache.get_or_load(
+            "departments", (faculty_id, page.cursor, page.limit), load
+        ),
     )
 
 
@@ -63,20 +97,46 @@ async def create_department(
             )
         ),
     )
-    new_department = Department(**department_data.model_dump())
-    db.add(new_department)
-    await db.commit()
-    await db.refresh(new_department)
+    new_department = await Department.create(db, department_data.model_dump())
+    # A faculty is served with its departments
+    await hierarchy_cache.invalidate(db, "departments", "faculties")
     return ResponseSchema(
         message="department successfully created",
         data={"department": DepartmentSchema(**new_department.__dict__).model_dump()},
     )
 
 
+@department_router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_departments(
+    departments_data: list[CreateUpdateDepartmentSchema],
+    atomic: bool = True,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you create many departments at once, e.g. every
+    department of a new faculty.
+
+    If a department can't be created none of them are and the error is returned.
+    Pass `atomic=false` to keep the departments that could be created, the others
+    are listed in `errors` by their position in the request.
+    """
+    result = await bulk_create_or_409(db, Department, departments_data, atomic)
+    await hierarchy_cache.invalidate(db, "departments", "faculties")
+    return ResponseSchema(
+        message=f"{len(result.items)} departments successfully created",
+        data={
+            "departments": [
+                DepartmentSchema(**department.__dict__).model_dump()
+                for department in result.items
+            ],
+            "errors": result.errors,
+        },
+    )
+
+
 @department_router.get("/{department_id}")
 async def get_department(
     department_id: UUID,
-    db: AsyncSession = Depends(get_session_as_dependency),
+    db: AsyncSession = Depends(get_read_session_as_dependency),
 ) -> ResponseSchema:
     """This endpoint let's you retrieve a department."""
     query = select(Department).where(Department.id == department_id)
@@ -92,3 +152,32 @@ async def get_department(
         message="department successfully retrieved",
         data={"department": DepartmentSchema(**department.__dict__).model_dump()},
     )
+
+
+@department_router.get("/{department_id}/download")
+async def download_department_data(
+    department_id: UUID,
+    format: FileFormat = FileFormat.DOCUMENT,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_session_as_dependency),
+):
+    """This endpoint lets you download the data of every class in a department
+    as a zip archive of files in the desired format.
+
+    Archived classes are left out unless `include_archived` is set."""
+    department = cast(
+        Department, (await get_model_by_id_or_404(db, Department, department_id))
+    )
+    query = (
+        select(Class)
+        .where(
+            Class.department_id == department.id,
+            *Class.get_archived_filter(include_archived),
+        )
+        .options(*Class.get_load_options(Class.EXPORT_RELATIONSHIPS))
+    )
+    classes = (await db.execute(query)).scalars().all()
+    # The exports read in their own sessions, the request's connection is released
+    # rather than held until the archive is sent
+    await db.close()
+    return get_classes_archive_response(classes, format, filename=department.name)
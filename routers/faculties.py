@@ -1,19 +1,31 @@
 from typing import cast
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_session_as_dependency
-from models import School, Faculty
+from db import get_session_as_dependency, get_read_session_as_dependency
+from extras.hierarchy_cache import hierarchy_cache
+from extras.exporter import FileFormat
+from models import School, Faculty, Department, Class
 from schemas import (
     ResponseSchema,
     DepartmentSchema,
     FacultySchema,
     CreateUpdateFacultySchema,
 )
-from utils import get_model_by_id_or_404, get_one_model_obj_by_query_or_404
+from utils import (
+    get_model_by_id_or_404,
+    update_model_by_id_or_404,
+    paginate_or_400,
+    PageParams,
+    get_one_model_obj_by_query_or_404,
+    get_classes_archive_response,
+    bulk_create_or_409,
+    get_version,
+    check_not_modified,
+)
 
 faculty_router = APIRouter(prefix="/faculties", tags=["faculties"])
 
@@ -21,24 +33,60 @@ faculty_router = APIRouter(prefix="/faculties", tags=["faculties"])
 @faculty_router.get("")
 async def get_school_faculties(
     school_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
     db: AsyncSession = Depends(get_session_as_dependency),
 ) -> ResponseSchema:
     """
     This endpoint lets you retrieve the faculties a school has by the school's unique identifier
 
     Note:
-        Current implementation does not support pagination but will get included in future releases.
+        Faculties are paginated, pass the returned `next_cursor` as the `cursor` to get the next
+        page. `next_cursor` is `null` on the last page. Send the returned `ETag` as
+        `If-None-Match` to get a 304 when the faculties are unchanged.
     """
-    school = cast(School, (await get_model_by_id_or_404(db, School, school_id)))
-    faculties = []
-    for faculty in await school.awaitable_attrs.faculties:
-        faculty.__dict__["departments"] = [
-            DepartmentSchema(**department.__dict__).model_dump()
-            for department in (await faculty.awaitable_attrs.departments)
-        ]
-        faculties.append(FacultySchema(**faculty.__dict__).model_dump())
+    school_faculty_ids = select(Faculty.id).where(Faculty.school_id == school_id)
+
+    async def load_version() -> list:
+        # An unknown school isn't cached, ids sent by clients would fill the cache
+        await get_model_by_id_or_404(db, School, school_id)
+        # Faculties are served with their departments
+        return await get_version(
+            db,
+            Faculty.get_version_query((Faculty.school_id == school_id,)),
+            Department.get_version_query(
+                (Department.faculty_id.in_(school_faculty_ids),)
+            ),
+        )
+
+    version = await hierarchy_cache.get_or_load(
+        "faculties", (school_id, "version"), load_version
+    )
+    check_not_modified(request, response, version)
+
+    async def load() -> dict:
+        faculty_page = await paginate_or_400(
+            db,
+            Faculty,
+            page,
+            where=(Faculty.school_id == school_id,),
+            load=("departments",),
+        )
+        faculties = []
+        for faculty in faculty_page.items:
+            faculty.__dict__["departments"] = [
+                DepartmentSchema(**department.__dict__).model_dump()
+                for department in (await faculty.awaitable_attrs.departments)
+            ]
+            faculties.append(FacultySchema(**faculty.__dict__).model_dump())
+        return {"faculties": faculties, "next_cursor": faculty_page.next_cursor}
+
     return ResponseSchema(
-        message="faculties successfully retrieved", data={"faculties": faculties}
+        message="faculties successfully retrieved",
+        data=await hierarchy_cache.get_or_load(
+            "faculties", (school_id, page.cursor, page.limit), load
+        ),
     )
 
 
@@ -59,6 +107,7 @@ async def create_school_faculty(
         School, (await get_model_by_id_or_404(db, School, faculty_data.school_id))
     )
     faculty = await Faculty.create(db=db, data=faculty_data.model_dump())
+    await hierarchy_cache.invalidate(db, "faculties")
     faculty.__dict__["departments"] = await faculty.awaitable_attrs.departments
     return ResponseSchema(
         message="faculties successfully created",
@@ -66,10 +115,37 @@ async def create_school_faculty(
     )
 
 
+@faculty_router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_faculties(
+    faculties_data: list[CreateUpdateFacultySchema],
+    atomic: bool = True,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you create many faculties at once, they may belong to
+    different schools.
+
+    If a faculty can't be created none of them are and the error is returned. Pass
+    `atomic=false` to keep the faculties that could be created, the others are
+    listed in `errors` by their position in the request.
+    """
+    result = await bulk_create_or_409(db, Faculty, faculties_data, atomic)
+    await hierarchy_cache.invalidate(db, "faculties")
+    return ResponseSchema(
+        message=f"{len(result.items)} faculties successfully created",
+        data={
+            "faculties": [
+                FacultySchema(**faculty.__dict__, departments=[]).model_dump()
+                for faculty in result.items
+            ],
+            "errors": result.errors,
+        },
+    )
+
+
 @faculty_router.get("/{faculty_id}")
 async def get_school_faculty(
     faculty_id: UUID,
-    db: AsyncSession = Depends(get_session_as_dependency),
+    db: AsyncSession = Depends(get_read_session_as_dependency),
 ) -> ResponseSchema:
     """This endpoint lets you retrieve a faculty by it's unique identifier"""
     query = select(Faculty).where(Faculty.id == faculty_id)
@@ -94,19 +170,41 @@ async def update_school_faculty(
         same faculties with different names.
         This endpoint will be protected by authentication
     """
-    query = select(Faculty).where(Faculty.id == faculty_id)
+    data = {"name": update_data.name} if update_data.name else {}
     faculty = cast(
-        Faculty,
-        (
-            await get_one_model_obj_by_query_or_404(
-                db=db, statement=query, resource_name="faculty"
-            )
-        ),
+        Faculty, (await update_model_by_id_or_404(db, Faculty, faculty_id, data))
     )
-    faculty.name = update_data.name or faculty.name
-    db.add(faculty)
-    await db.commit()
+    await hierarchy_cache.invalidate(db, "faculties")
+    faculty.__dict__["departments"] = await faculty.awaitable_attrs.departments
     return ResponseSchema(
         message="faculty successfully updated",
         data={"faculty": FacultySchema(**faculty.__dict__).model_dump()},
     )
+
+
+@faculty_router.get("/{faculty_id}/download")
+async def download_faculty_data(
+    faculty_id: UUID,
+    format: FileFormat = FileFormat.DOCUMENT,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_session_as_dependency),
+):
+    """This endpoint lets you download the data of every class in a faculty
+    as a zip archive of files in the desired format, grouped by department.
+
+    Archived classes are left out unless `include_archived` is set."""
+    faculty = cast(Faculty, (await get_model_by_id_or_404(db, Faculty, faculty_id)))
+    query = (
+        select(Class)
+        .join(Class.department)
+        .where(
+            Department.faculty_id == faculty.id,
+            *Class.get_archived_filter(include_archived),
+        )
+        .options(*Class.get_load_options(Class.EXPORT_RELATIONSHIPS))
+    )
+    classes = (await db.execute(query)).scalars().all()
+    # The exports read in their own sessions, the request's connection is released
+    # rather than held until the archive is sent
+    await db.close()
+    return get_classes_archive_response(classes, format, filename=faculty.name)
@@ -0,0 +1,48 @@
+from dataclasses import asdict
+from uuid import UUID
+
+from fastapi import APIRouter, status, HTTPException
+from fastapi.responses import FileResponse
+
+from extras.exporter import get_media_type
+from extras.jobs import export_job_queue, ExportJob
+from schemas import ExportJobSchema, ResponseSchema
+
+job_router = APIRouter(prefix="/export-jobs", tags=["export jobs"])
+
+
+def get_job_or_404(job_id: UUID) -> ExportJob:
+    job = export_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"export job with id {job_id} not found",
+        )
+    return job
+
+
+@job_router.get("/{job_id}")
+async def get_export_job(job_id: UUID) -> ResponseSchema:
+    """This endpoint lets you poll the status and progress of an export job"""
+    job = get_job_or_404(job_id)
+    return ResponseSchema(
+        message="export job successfully retrieved",
+        data={"job": ExportJobSchema(**asdict(job)).model_dump()},
+    )
+
+
+@job_router.get("/{job_id}/download")
+async def download_export_job(job_id: UUID):
+    """This endpoint lets you download the file of a succeeded export job"""
+    job = get_job_or_404(job_id)
+    result = export_job_queue.get_result(job)
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"export job is {job.status.value}",
+        )
+    return FileResponse(
+        result,
+        media_type=get_media_type(job.format),
+        filename=f"{job.id}.{job.format.value}",
+    )
@@ -1,17 +1,26 @@
 from typing import cast
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_session_as_dependency
+from db import get_session_as_dependency, get_read_session_as_dependency
+from extras.hierarchy_cache import hierarchy_cache
 from models import School
 from schemas import (
     SchoolSchema,
     CreateUpdateSchoolSchema,
     ResponseSchema,
 )
-from utils import get_model_by_id_or_404
+from utils import (
+    get_model_by_id_or_404,
+    update_model_by_id_or_404,
+    paginate_or_400,
+    PageParams,
+    bulk_create_or_409,
+    get_version,
+    check_not_modified,
+)
 
 school_router = APIRouter(
     prefix="/schools",
@@ -34,36 +43,78 @@ async def create_school(
     """
     # TODO: Require admin scope to create new schools
     new_school = await School.create(db=db, data=school_data.model_dump())
+    await hierarchy_cache.invalidate(db, "schools")
     return ResponseSchema(
         message="school successfully created",
         data={"school": SchoolSchema(**new_school.__dict__).model_dump()},
     )
 
 
+@school_router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_schools(
+    schools_data: list[CreateUpdateSchoolSchema],
+    atomic: bool = True,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you create many schools at once.
+
+    The schools are created together, if one of them can't be, e.g. because its
+    name is taken, none are and the error is returned. Pass `atomic=false` to create
+    the others anyway, the schools that failed are listed in `errors` by their
+    position in the request.
+    """
+    result = await bulk_create_or_409(db, School, schools_data, atomic)
+    await hierarchy_cache.invalidate(db, "schools")
+    return ResponseSchema(
+        message=f"{len(result.items)} schools successfully created",
+        data={
+            "schools": [
+                SchoolSchema(**school.__dict__).model_dump() for school in result.items
+            ],
+            "errors": result.errors,
+        },
+    )
+
+
 @school_router.get("")
 async def get_schools(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
     db: AsyncSession = Depends(get_session_as_dependency),
 ) -> ResponseSchema:
     """This endpoint let's you retrieve all the available Schools (University / Polytechnic / College of Education)
     on the Orderlie platform.
 
     Note:
-        Current implementation does not support pagination but will get included in future releases.
+        Schools are paginated, pass the returned `next_cursor` as the `cursor` to get the next
+        page. `next_cursor` is `null` on the last page. Send the returned `ETag` as
+        `If-None-Match` to get a 304 when the schools are unchanged.
     """
-    # TODO: Pagination
-    schools = [
-        SchoolSchema(**school.__dict__).model_dump()
-        for school in (await School.all(db))
-    ]
+    version = await hierarchy_cache.get_or_load(
+        "schools", ("version",), lambda: get_version(db, School.get_version_query())
+    )
+    check_not_modified(request, response, version)
+
+    async def load() -> dict:
+        school_page = await paginate_or_400(db, School, page)
+        schools = [
+            SchoolSchema(**school.__dict__).model_dump() for school in school_page.items
+        ]
+        return {"schools": schools, "next_cursor": school_page.next_cursor}
+
     return ResponseSchema(
-        message="schools successfully retrieved", data={"schools": schools}
+        message="schools successfully retrieved",
+        data=await hierarchy_cache.get_or_load(
+            "schools", (page.cursor, page.limit), load
+        ),
     )
 
 
 @school_router.get("/{school_id}")
 async def get_school(
     school_id: UUID,
-    db: AsyncSession = Depends(get_session_as_dependency),
+    db: AsyncSession = Depends(get_read_session_as_dependency),
 ) -> ResponseSchema:
     """
     This endpoint let's you retrieve a Schools (University / Polytechnic / College of Education)
@@ -90,11 +141,11 @@ async def update_school(
         same institution with different names.
         This endpoint will be protected by authentication
     """
-    school = cast(School, (await get_model_by_id_or_404(db, School, school_id)))
-    school.name = update_data.name or school.name
-    db.add(school)
-    await db.commit()
-    await db.refresh(school)
+    data = {"name": update_data.name} if update_data.name else {}
+    school = cast(
+        School, (await update_model_by_id_or_404(db, School, school_id, data))
+    )
+    await hierarchy_cache.invalidate(db, "schools")
     return ResponseSchema(
         message="school successfully updated",
         data={"school": SchoolSchema(**school.__dict__).model_dump()},
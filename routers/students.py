@@ -1,12 +1,13 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, status, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import get_session_as_dependency
 from models import Student, Class
 from schemas import StudentSchema, ResponseSchema, CreateStudentSchema
-from utils import get_model_by_id_or_404
+from utils import get_model_by_id_or_404, bulk_create_or_409
 
 student_router = APIRouter(prefix="/students", tags=["students"])
 
@@ -18,13 +19,48 @@ async def create_student(
 ):
     """This endpoint lets you create a student as a member of a class"""
     data = student_data.model_dump()
-    student = await Student.create(db, data)
+    try:
+        student = await Student.create(db, data)
+    except IntegrityError as e:
+        for field in ("matriculation_number", "jamb_registration_number"):
+            if f"uq_students_class_id_{field}" in str(e.orig):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"a student with this {field.replace('_', ' ')} is already in the class",
+                )
+        raise
     return ResponseSchema(
         message="students successfully retrieved",
         data={"student": StudentSchema(**student.__dict__).model_dump()},
     )
 
 
+@student_router.post("/bulk", status_code=status.HTTP_201_CREATED)
+async def create_students(
+    students_data: list[CreateStudentSchema],
+    atomic: bool = True,
+    db: AsyncSession = Depends(get_session_as_dependency),
+) -> ResponseSchema:
+    """This endpoint lets you add many students to their classes at once.
+
+    If a student can't be added, e.g. because their matriculation number is already
+    in the class, none of them are and the error is returned. Pass `atomic=false` to
+    add the other students anyway, those that failed are listed in `errors` by their
+    position in the request.
+    """
+    result = await bulk_create_or_409(db, Student, students_data, atomic)
+    return ResponseSchema(
+        message=f"{len(result.items)} students successfully created",
+        data={
+            "students": [
+                StudentSchema(**student.__dict__).model_dump()
+                for student in result.items
+            ],
+            "errors": result.errors,
+        },
+    )
+
+
 @student_router.patch("/{student_id}")
 async def partial_update_student(
     student_id: UUID,
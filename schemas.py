@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import IntEnum, Enum
 from typing import Optional
 from uuid import UUID
@@ -19,6 +20,14 @@ class AdmissionMode(str, Enum):
     UTME = "utme"
     DIRECT_ENTRY = "direct_entry"
 
+    @classmethod
+    def _missing_(cls, value):
+        # Rosters exported before the modes were exported by value hold their names,
+        # e.g. `UTME`, they're accepted so the files can be imported back
+        if isinstance(value, str):
+            return cls.__members__.get(value.strip().upper())
+        return None
+
 
 class CreateClassSchema(BaseModel):
     display_name: str | None
@@ -107,6 +116,16 @@ class ClassSchema(BaseModel):
     deputy_id: Optional[UUID]
 
 
+class ExportJobSchema(BaseModel):
+    id: UUID
+    format: str
+    status: str
+    created_at: datetime
+    updated_at: datetime
+    progress: int
+    error: str | None
+
+
 class ResponseSchema(BaseModel):
     message: str | None
     data: dict | list | None
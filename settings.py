@@ -1,4 +1,6 @@
 from enum import Enum
+from pathlib import Path
+from tempfile import gettempdir
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,6 +10,11 @@ class AppMode(str, Enum):
     PRODUCTION = "production"
 
 
+class ExecutorKind(str, Enum):
+    PROCESS = "process"
+    THREAD = "thread"
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     POSTGRES_PORT: int
@@ -16,6 +23,48 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_HOST: str
     APP_MODE: AppMode
+    # An optional read replica, its unset connection settings are the primary's
+    POSTGRES_REPLICA_HOST: str | None = None
+    POSTGRES_REPLICA_PORT: int | None = None
+    POSTGRES_REPLICA_USER: str | None = None
+    POSTGRES_REPLICA_PASSWORD: str | None = None
+    POSTGRES_REPLICA_DB: str | None = None
+    # How long a client's reads are sent to the primary after it writes
+    READ_YOUR_WRITES_SECONDS: int = 5
+    EXPORT_EXECUTOR: ExecutorKind = ExecutorKind.PROCESS
+    EXPORT_MAX_WORKERS: int = 2
+    EXPORT_MAX_QUEUED: int = 8
+    EXPORT_CACHE_DIR: Path = Path(gettempdir()) / "orderlie-exports"
+    EXPORT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    EXPORT_JOBS_DIR: Path = Path(gettempdir()) / "orderlie-export-jobs"
+    EXPORT_JOBS_MAX_CONCURRENT: int = 2
+    EXPORT_JOBS_MAX_QUEUED: int = 16
+    EXPORT_JOBS_RETENTION_SECONDS: int = 24 * 60 * 60
+    EXPORT_JOBS_MAX_STORED: int = 500
+    # The number of gunicorn workers, each of them has its own connection pool
+    WEB_CONCURRENCY: int = 4
+    # The connections all the workers may hold at once, below postgres' own limit. The
+    # replica's pools are sized the same against the replica's limit.
+    DB_MAX_CONNECTIONS: int = 40
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    DB_POOL_TIMEOUT: float = 10
+    DB_POOL_RECYCLE: int = 30 * 60
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_ECHO: bool | None = None
+    # Statements slower than this are logged
+    SLOW_QUERY_SECONDS: float = 0.2
+    # A request executing a statement more than this many times is logged
+    QUERY_REPEAT_THRESHOLD: int = 10
+    # The rows inserted per statement by bulk creates, and the most rows per request
+    BULK_CREATE_CHUNK_SIZE: int = 500
+    BULK_CREATE_MAX_ROWS: int = 10_000
+    # Cached school / faculty / department responses, see `extras.hierarchy_cache`
+    HIERARCHY_CACHE_TTL_SECONDS: float = 5 * 60
+    HIERARCHY_CACHE_MAX_ENTRIES: int = 1024
+    # A `module:Class` path of a backend shared by the workers, in memory if unset
+    HIERARCHY_CACHE_BACKEND: str | None = None
 
     def get_database_url(self) -> str:
         """Provides the database url string from settings configuration"""
@@ -24,5 +73,41 @@ class Settings(BaseSettings):
             f"{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    def get_replica_database_url(self) -> str | None:
+        """Provides the database url of the read replica, if one is configured"""
+        if self.POSTGRES_REPLICA_HOST is None:
+            return None
+        return (
+            f"postgresql+asyncpg://{self.POSTGRES_REPLICA_USER or self.POSTGRES_USER}:"
+            f"{self.POSTGRES_REPLICA_PASSWORD or self.POSTGRES_PASSWORD}@"
+            f"{self.POSTGRES_REPLICA_HOST}:{self.POSTGRES_REPLICA_PORT or self.POSTGRES_PORT}/"
+            f"{self.POSTGRES_REPLICA_DB or self.POSTGRES_DB}"
+        )
+
+    def get_pool_limits(self) -> tuple[int, int]:
+        """Provides the pool size and max overflow of a worker's connection pool.
+
+        Unless they're set, `DB_MAX_CONNECTIONS` is shared evenly between the
+        `WEB_CONCURRENCY` workers, half of a worker's share is kept open in its pool
+        and the rest is opened as overflow under load. With the in-memory hierarchy
+        cache, one connection of the share is left to the worker's invalidation
+        listener.
+        """
+        share = self.DB_MAX_CONNECTIONS // self.WEB_CONCURRENCY
+        if self.HIERARCHY_CACHE_BACKEND is None:
+            share -= 1
+        share = max(share, 2)
+        pool_size = share // 2 if self.DB_POOL_SIZE is None else self.DB_POOL_SIZE
+        max_overflow = (
+            share - pool_size if self.DB_MAX_OVERFLOW is None else self.DB_MAX_OVERFLOW
+        )
+        return pool_size, max_overflow
+
+    def get_database_echo(self) -> bool:
+        """Whether statements are logged, by default only in development"""
+        if self.DB_ECHO is None:
+            return self.APP_MODE == AppMode.DEVELOPMENT
+        return self.DB_ECHO
+
 
 default_settings = Settings()
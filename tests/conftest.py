@@ -0,0 +1,36 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# The settings are read when the app's modules are imported, the tests don't connect
+# to the database so placeholders are enough
+for name, value in {
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_USER": "orderlie",
+    "POSTGRES_PASSWORD": "orderlie",
+    "POSTGRES_DB": "orderlie",
+    "APP_MODE": "production",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def get_rows():
+    """Provides SQLAlchemy rows of students, as the roster queries stream them"""
+    engine = create_engine("sqlite://")
+
+    def get_rows(count: int) -> list:
+        with engine.connect() as connection:
+            return list(
+                connection.execute(
+                    text(
+                        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 "
+                        "FROM n WHERE i < :count) SELECT 'Ada', 'Obi ' || i, 100 FROM n"
+                    ),
+                    {"count": count},
+                )
+            )
+
+    return get_rows
@@ -0,0 +1,74 @@
+import asyncio
+import glob
+import os
+import tempfile
+from io import BytesIO
+
+import pytest
+from docx import Document
+from openpyxl import load_workbook
+
+from extras.executor import ExportExecutor
+from extras.exporter import ExportData, FileFormat, get_exporter
+from settings import ExecutorKind
+
+HEADERS = ("First Name", "Last Name", "Level")
+METADATA = {"Display Name": "Class", "School": "Unilag", "Level": 100}
+# More rows than a chunk sent to a worker process
+ROW_COUNT = 1200
+
+
+@pytest.fixture(params=[ExecutorKind.PROCESS, ExecutorKind.THREAD])
+def executor(request):
+    executor = ExportExecutor(request.param, max_workers=1, max_queued=1)
+    yield executor
+    executor.shutdown()
+
+
+async def iterate(rows, fail_at: int | None = None):
+    for index, row in enumerate(rows):
+        if index == fail_at:
+            raise ValueError("the roster stream failed")
+        yield row
+
+
+def export(executor: ExportExecutor, format: FileFormat, rows) -> BytesIO:
+    exporter = get_exporter(format)
+    exporter.load_data(ExportData(HEADERS, rows, METADATA))
+
+    async def run() -> bytes:
+        content = await executor.export(exporter)
+        return b"".join([chunk async for chunk in content])
+
+    return BytesIO(asyncio.run(run()))
+
+
+def test_xlsx_is_rendered(executor, get_rows):
+    file = export(executor, FileFormat.EXCEL, iterate(get_rows(ROW_COUNT)))
+
+    workbook = load_workbook(file, read_only=True)
+    rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+    assert rows[-ROW_COUNT:] == [
+        ("Ada", f"Obi {i}", 100) for i in range(1, ROW_COUNT + 1)
+    ]
+
+
+def test_docx_is_rendered(executor, get_rows):
+    file = export(executor, FileFormat.DOCUMENT, iterate(get_rows(ROW_COUNT)))
+
+    (table,) = Document(file).tables
+    assert len(table.rows) == ROW_COUNT + 1
+    assert [cell.text for cell in table.rows[-1].cells] == [
+        "Ada",
+        f"Obi {ROW_COUNT}",
+        "100",
+    ]
+
+
+def test_failed_row_stream_fails_the_export(executor, get_rows):
+    rows = iterate(get_rows(ROW_COUNT), fail_at=ROW_COUNT - 1)
+
+    with pytest.raises(ValueError, match="roster stream failed"):
+        export(executor, FileFormat.EXCEL, rows)
+    pattern = os.path.join(tempfile.gettempdir(), "orderlie-render-*")
+    assert glob.glob(pattern) == []
@@ -0,0 +1,26 @@
+import asyncio
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from extras.exporter import ExportData, FileFormat, get_exporter
+
+HEADERS = ("First Name", "Last Name", "Level")
+METADATA = {"Display Name": "Class", "School": "Unilag", "Level": 100}
+
+
+async def iterate(rows):
+    for row in rows:
+        yield row
+
+
+def test_xlsx_renders_sqlalchemy_rows(get_rows):
+    exporter = get_exporter(FileFormat.EXCEL)
+    exporter.load_data(ExportData(HEADERS, iterate(get_rows(3)), METADATA))
+
+    async def export() -> bytes:
+        return b"".join([chunk async for chunk in exporter.export()])
+
+    workbook = load_workbook(BytesIO(asyncio.run(export())), read_only=True)
+    rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+    assert rows[-3:] == [("Ada", f"Obi {i}", 100) for i in (1, 2, 3)]
@@ -0,0 +1,115 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from extras import hierarchy_cache
+from extras.hierarchy_cache import HierarchyCache, MemoryBackend
+from models import Faculty, School
+from routers import departments, faculties
+from utils import PageParams
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(hierarchy_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    backend = MemoryBackend(ttl_seconds=60, max_entries=10)
+    asyncio.run(backend.set("schools:a", 1))
+
+    clock.now += 59
+    assert asyncio.run(backend.get("schools:a")) == 1
+    clock.now += 1
+    assert asyncio.run(backend.get("schools:a")) is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    backend = MemoryBackend(ttl_seconds=60, max_entries=2)
+
+    async def run():
+        await backend.set("schools:a", 1)
+        await backend.set("schools:b", 2)
+        # Reading `a` makes `b` the least recently used
+        await backend.get("schools:a")
+        await backend.set("schools:c", 3)
+        return [
+            await backend.get(key) for key in ("schools:a", "schools:b", "schools:c")
+        ]
+
+    assert asyncio.run(run()) == [1, None, 3]
+
+
+def test_invalidation_drops_only_its_namespaces(clock):
+    backend = MemoryBackend(ttl_seconds=60, max_entries=10)
+
+    async def run():
+        await backend.set("schools:a", 1)
+        await backend.set("faculties:a", 2)
+        await backend.set("departments:a", 3)
+        await backend.invalidate(["schools", "departments"])
+        return [
+            await backend.get(key)
+            for key in ("schools:a", "faculties:a", "departments:a")
+        ]
+
+    assert asyncio.run(run()) == [None, 2, None]
+
+
+def test_load_racing_an_invalidation_is_not_cached(clock):
+    cache = HierarchyCache(MemoryBackend(ttl_seconds=60, max_entries=10))
+
+    async def run():
+        async def load():
+            await cache.invalidate_locally(["schools"])
+            return ["stale"]
+
+        assert await cache.get_or_load("schools", ("list",), load) == ["stale"]
+        return await cache.backend.get(cache.get_key("schools", "list"))
+
+    assert asyncio.run(run()) is None
+
+
+@pytest.mark.parametrize(
+    "router, handler, parent",
+    [
+        (faculties, "get_school_faculties", School),
+        (departments, "get_departments", Faculty),
+    ],
+)
+def test_versions_of_unknown_parents_are_not_cached(
+    clock, monkeypatch, router, handler, parent
+):
+    cache = HierarchyCache(MemoryBackend(ttl_seconds=60, max_entries=10))
+    monkeypatch.setattr(router, "hierarchy_cache", cache)
+
+    async def get_by_id(db, id, load=()):
+        return None
+
+    monkeypatch.setattr(parent, "get_by_id", get_by_id)
+    request = Request(
+        {"type": "http", "method": "GET", "path": "/", "query_string": b""}
+    )
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(
+            getattr(router, handler)(
+                uuid.uuid4(), request, Response(), PageParams(), db=None
+            )
+        )
+    assert error.value.status_code == 404
+    assert not cache.backend._entries
@@ -0,0 +1,145 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from pydantic import BaseModel
+from uuid import uuid4
+
+from extras.exporter import ExportData, FileFormat, get_exporter
+from extras.importer import ImportFileError, read_rows, validate_rows
+from extras.spreadsheet import XLSXExporter
+from models import STUDENT_EXPORT_COLUMNS
+from schemas import AdmissionMode, CreateStudentSchema
+
+ROWS = [
+    ("Ada", "Ngozi", "Obi", "utme", "MAT/001", "JAMB/001", "ada@example.com"),
+    ("Tunde", "Ayo", "Bello", "direct_entry", None, None, "tunde@example.com"),
+]
+METADATA = {
+    "Display Name": "Class of 2027",
+    "Level": 100,
+    "Department": "Physics",
+    "Faculty": "Science",
+    "School": "University of Lagos",
+}
+
+
+async def iterate(rows):
+    for row in rows:
+        yield row
+
+
+def export(format: FileFormat, rows) -> BytesIO:
+    exporter = get_exporter(format)
+    exporter.load_data(
+        ExportData(tuple(STUDENT_EXPORT_COLUMNS), iterate(rows), METADATA)
+    )
+
+    async def read() -> bytes:
+        return b"".join([chunk async for chunk in exporter.export()])
+
+    return BytesIO(asyncio.run(read()))
+
+
+def import_rows(file: BytesIO, format: FileFormat) -> dict:
+    class_id = uuid4()
+    batches = list(
+        validate_rows(
+            read_rows(file, format), CreateStudentSchema, {"class_id": class_id}
+        )
+    )
+    assert [error for batch in batches for error in batch.errors] == []
+    return {
+        row_no: student for batch in batches for row_no, student in batch.rows.items()
+    }
+
+
+def test_xlsx_export_is_imported_back():
+    students = import_rows(export(FileFormat.EXCEL, ROWS), FileFormat.EXCEL)
+
+    # The metadata block and the blank row under it are above the headers
+    header_row = len(XLSXExporter.METADATA_FIELDS) + 2
+    assert list(students) == [header_row + 1, header_row + 2]
+    first, second = students.values()
+    assert first.first_name == "Ada"
+    assert first.admission_mode == AdmissionMode.UTME
+    assert first.matriculation_number == "MAT/001"
+    assert second.admission_mode == AdmissionMode.DIRECT_ENTRY
+    assert second.jamb_registration_number is None
+
+
+def test_csv_export_is_imported_back():
+    students = import_rows(export(FileFormat.CSV, ROWS), FileFormat.CSV)
+
+    assert list(students) == [2, 3]
+    assert [student.last_name for student in students.values()] == ["Obi", "Bello"]
+
+
+def test_admission_modes_are_imported_by_name():
+    rows = [
+        (*row[:3], mode, *row[4:]) for row, mode in zip(ROWS, ("UTME", "Direct_Entry"))
+    ]
+    students = import_rows(export(FileFormat.CSV, rows), FileFormat.CSV)
+
+    assert [student.admission_mode for student in students.values()] == [
+        AdmissionMode.UTME,
+        AdmissionMode.DIRECT_ENTRY,
+    ]
+
+
+HEADERS = ("First Name", "Middle Name", "Last Name", "Admission Mode")
+
+
+class NameSchema(BaseModel):
+    first_name: str
+    middle_name: str | None
+    last_name: str
+    admission_mode: AdmissionMode
+
+
+def validate(rows, batch_size: int = 1000) -> list:
+    return list(validate_rows(iter(rows), NameSchema, {}, batch_size=batch_size))
+
+
+def test_empty_cells_are_nulls_and_empty_rows_are_skipped():
+    (batch,) = validate(
+        [HEADERS, (" Ada ", "", "Obi", "utme"), ("", None, "", ""), (None,) * 4]
+    )
+
+    assert list(batch.rows) == [2]
+    assert batch.rows[2].first_name == "Ada"
+    assert batch.rows[2].middle_name is None
+    assert batch.errors == []
+
+
+def test_invalid_rows_are_reported_by_row_and_field():
+    (batch,) = validate(
+        [HEADERS, ("Ada", "", "Obi", "utme"), ("Tunde", "", "", "transfer")]
+    )
+
+    assert list(batch.rows) == [2]
+    (error,) = batch.errors
+    assert error.row == 3
+    assert {field["field"] for field in error.errors} == {
+        "last_name",
+        "admission_mode",
+    }
+
+
+def test_rows_are_validated_in_batches():
+    rows = [("Ada", "", f"Obi {i}", "utme") for i in range(5)]
+    batches = validate([HEADERS, *rows], batch_size=2)
+
+    assert [list(batch.rows) for batch in batches] == [[2, 3], [4, 5], [6]]
+
+
+def test_rows_above_the_headers_are_skipped():
+    (batch,) = validate([("School", "Unilag"), (), HEADERS, ("Ada", "", "Obi", "utme")])
+
+    assert list(batch.rows) == [4]
+
+
+@pytest.mark.parametrize("rows", [[], [("School", "Unilag"), ("Ada", "Obi")]])
+def test_file_without_headers_is_rejected(rows):
+    with pytest.raises(ImportFileError):
+        validate(rows)
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+from extras.exporter import FileFormat
+from extras.jobs import ExportJob, ExportJobQueue, JobStatus
+
+
+@pytest.fixture
+def queue(tmp_path) -> ExportJobQueue:
+    return ExportJobQueue(
+        directory=tmp_path,
+        max_concurrent=1,
+        max_queued=1,
+        retention_seconds=3600,
+        max_stored=10,
+    )
+
+
+@pytest.fixture
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def save_job(queue: ExportJobQueue, owner: int | None) -> ExportJob:
+    now = time.time()
+    job = ExportJob(
+        id=uuid.uuid4(),
+        format=FileFormat.EXCEL,
+        status=JobStatus.RUNNING,
+        created_at=now,
+        updated_at=now,
+        owner=owner,
+    )
+    queue._save(job)
+    return job
+
+
+def test_jobs_of_a_dead_worker_fail_when_read(queue, dead_pid):
+    job = save_job(queue, owner=dead_pid)
+
+    stored = queue.get(job.id)
+    assert stored.status == JobStatus.FAILED
+    assert stored.error == "export interrupted"
+    assert queue.get(job.id).status == JobStatus.FAILED
+
+
+def test_jobs_of_a_live_worker_are_left_running(queue):
+    job = save_job(queue, owner=os.getppid())
+
+    assert queue.get(job.id).status == JobStatus.RUNNING
+
+
+def test_recover_fails_the_jobs_left_by_a_reused_pid(queue, dead_pid):
+    left = save_job(queue, owner=os.getpid())
+    orphaned = save_job(queue, owner=dead_pid)
+    running = save_job(queue, owner=os.getppid())
+
+    queue.recover()
+
+    assert queue.get(left.id).status == JobStatus.FAILED
+    assert queue.get(orphaned.id).status == JobStatus.FAILED
+    assert queue.get(running.id).status == JobStatus.RUNNING
+
+
+def test_jobs_of_this_worker_are_left_running(queue):
+    async def run():
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def export():
+            started.set()
+            await finish.wait()
+            return aiter_chunks()
+
+        async def aiter_chunks():
+            yield b"data"
+
+        job = queue.submit(export, FileFormat.EXCEL)
+        await started.wait()
+        assert queue.get(job.id).status == JobStatus.RUNNING
+        finish.set()
+        await asyncio.gather(*queue._tasks)
+        return job
+
+    job = asyncio.run(run())
+    assert queue.get(job.id).status == JobStatus.SUCCEEDED
@@ -0,0 +1,25 @@
+from uuid import uuid4
+
+import pytest
+
+from models import InvalidCursorError, ModelMixin
+
+
+def test_cursor_is_decoded_back_to_its_id():
+    id = uuid4()
+    cursor = ModelMixin.encode_cursor(id)
+
+    assert ModelMixin.decode_cursor(cursor) == id
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = ModelMixin.encode_cursor(uuid4())
+
+    assert len(cursor) == 22
+    assert cursor.isascii() and not set(cursor) & set("+/=")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "AAAA", "é" * 22])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        ModelMixin.decode_cursor(cursor)
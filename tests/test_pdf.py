@@ -0,0 +1,57 @@
+import re
+
+from extras.pdf import PDFWriter, escape_text
+
+
+def write_document(pages: int) -> bytes:
+    writer = PDFWriter(842, 595, ("Helvetica", "Helvetica-Bold"))
+    parts = [writer.begin()]
+    for page in range(pages):
+        parts.append(writer.add_page(b"BT /F1 10 Tf 20 20 Td (%d) Tj ET" % page))
+    parts.append(writer.end())
+    return b"".join(parts)
+
+
+def test_xref_offsets_point_at_their_objects():
+    document = write_document(pages=3)
+
+    xref = re.search(rb"xref\n0 (\d+)\n((?:\d{10} \d{5} [fn] \n)+)", document)
+    size = int(xref[1])
+    entries = xref[2].splitlines()
+    # The free entry, the catalog, the page tree, the two fonts, and a content stream
+    # and a page object per page
+    assert size == len(entries) == 1 + 2 + 2 + 3 * 2
+    assert entries[0] == b"0000000000 65535 f "
+    for number, entry in enumerate(entries[1:], start=1):
+        offset = int(entry[:10])
+        assert document[offset:].startswith(b"%d 0 obj\n" % number)
+
+
+def test_trailer_points_at_the_xref():
+    document = write_document(pages=1)
+
+    startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", document)[1])
+    xref_header = document[startxref:].split(b"\n")[:2]
+    assert xref_header[0] == b"xref"
+    size = re.search(rb"/Size (\d+) /Root 1 0 R", document)[1]
+    assert xref_header[1] == b"0 " + size
+
+
+def test_page_tree_lists_every_page():
+    document = write_document(pages=2)
+
+    assert b"/Type /Pages /Kids [6 0 R 8 0 R] /Count 2" in document
+
+
+def test_text_is_escaped():
+    assert escape_text("a (b) \\ c") == b"(a \\(b\\) \\\\ c)"
+
+
+def test_letters_outside_cp1252_lose_their_diacritics():
+    assert escape_text("Adéọlá Ṣẹgun") == "(Adéolá Segun)".encode("cp1252")
+    # Decomposed letters are set the same
+    assert escape_text("S\u0323e\u0323gun") == b"(Segun)"
+
+
+def test_characters_without_a_cp1252_base_are_replaced():
+    assert escape_text("Ada 😀") == b"(Ada ?)"
@@ -0,0 +1,39 @@
+import pytest
+
+from settings import Settings
+
+
+def get_settings(**settings) -> Settings:
+    return Settings(_env_file=None, **settings)
+
+
+@pytest.mark.parametrize(
+    "settings, limits",
+    [
+        # One connection of each worker's share of 10 is left to its listener
+        ({"DB_MAX_CONNECTIONS": 40, "WEB_CONCURRENCY": 4}, (4, 5)),
+        # A shared hierarchy cache has no listener
+        (
+            {
+                "DB_MAX_CONNECTIONS": 40,
+                "WEB_CONCURRENCY": 4,
+                "HIERARCHY_CACHE_BACKEND": "cache:Backend",
+            },
+            (5, 5),
+        ),
+        # A worker has at least two connections
+        ({"DB_MAX_CONNECTIONS": 4, "WEB_CONCURRENCY": 8}, (1, 1)),
+        ({"DB_MAX_CONNECTIONS": 40, "WEB_CONCURRENCY": 4, "DB_POOL_SIZE": 2}, (2, 7)),
+        (
+            {
+                "DB_MAX_CONNECTIONS": 40,
+                "WEB_CONCURRENCY": 4,
+                "DB_POOL_SIZE": 3,
+                "DB_MAX_OVERFLOW": 0,
+            },
+            (3, 0),
+        ),
+    ],
+)
+def test_pool_limits(settings, limits):
+    assert get_settings(**settings).get_pool_limits() == limits
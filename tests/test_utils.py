@@ -0,0 +1,106 @@
+import asyncio
+import warnings
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import Department, Faculty, School
+from utils import check_not_modified, get_version
+
+
+def get_request(query: str = "", if_none_match: str | None = None) -> Request:
+    headers = (
+        [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    )
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/v1/schools",
+            "query_string": query.encode(),
+            "headers": headers,
+        }
+    )
+
+
+def get_etag(version, query: str = "") -> str:
+    response = Response()
+    check_not_modified(get_request(query), response, version)
+    return response.headers["ETag"]
+
+
+def test_etag_is_set_on_the_response():
+    response = Response()
+    check_not_modified(get_request(), response, (3, "2026-01-01"))
+
+    assert response.headers["ETag"].startswith('W/"')
+    assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_etag_changes_with_the_version_and_the_query():
+    etag = get_etag((3, "2026-01-01"))
+
+    assert get_etag((3, "2026-01-01")) == etag
+    assert get_etag((4, "2026-01-01")) != etag
+    assert get_etag((3, "2026-01-01"), query="limit=10") != etag
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    [
+        "{etag}",
+        "{strong}",
+        'W/"other", {etag}',
+        "*",
+    ],
+)
+def test_current_copy_is_not_modified(if_none_match):
+    etag = get_etag((3, None))
+    header = if_none_match.format(etag=etag, strong=etag.removeprefix("W/"))
+
+    with pytest.raises(HTTPException) as raised:
+        check_not_modified(get_request(if_none_match=header), Response(), (3, None))
+
+    assert raised.value.status_code == 304
+    assert raised.value.headers["ETag"] == etag
+
+
+def test_stale_copy_is_sent_again():
+    etag = get_etag((3, None))
+    response = Response()
+
+    check_not_modified(get_request(if_none_match=etag), response, (4, None))
+
+    assert response.headers["ETag"] != etag
+
+
+class SyncSession:
+    """Runs the statements of an async session on a sync one"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+
+def test_version_queries_are_read_in_one_row():
+    engine = create_engine("sqlite://")
+    for model in (School, Faculty, Department):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        session.execute(School.__table__.insert(), [{"id": uuid4(), "name": "A"}])
+        db = SyncSession(session)
+        with warnings.catch_warnings():
+            # e.g. SQLAlchemy's warning of a cartesian product
+            warnings.simplefilter("error")
+            version = asyncio.run(
+                get_version(db, School.get_version_query(), Faculty.get_version_query())
+            )
+
+    assert len(version) == 4
+    assert version[0] == 1
+    assert version[2:] == [0, None]
@@ -1,15 +1,51 @@
-from typing import Type
-from uuid import UUID
+import asyncio
+import hashlib
+import tempfile
+from functools import reduce
+from io import BufferedReader
+from typing import Type, Sequence, AsyncIterator, IO, Annotated
+from urllib.parse import quote
+from uuid import UUID, uuid4
 
-from fastapi import HTTPException, status
-from sqlalchemy import Executable
+from fastapi import HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import Executable, Select, select, true
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import M
+from db import copy_query_to_csv, get_snapshot_session
+from extras.cache import export_cache
+from extras.archive import stream_zip
+from extras.executor import export_executor, ExportQueueFullError
+from extras.exporter import DocumentExporter, FileFormat, get_exporter
+from extras.importer import (
+    RowError,
+    IMPORT_MAX_BYTES,
+    IMPORT_SPOOL_BYTES,
+    read_rows,
+    validate_rows,
+)
+from models import (
+    M,
+    BulkCreateResult,
+    Class,
+    Student,
+    Page,
+    InvalidCursorError,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
+from schemas import CreateStudentSchema
+from settings import default_settings
 
 
-async def get_model_by_id_or_404(db: AsyncSession, model_class: Type[M], id: UUID) -> M:
-    model: M | None = await model_class.get_by_id(db=db, id=id)
+async def get_model_by_id_or_404(
+    db: AsyncSession, model_class: Type[M], id: UUID, load: Sequence[str] = ()
+) -> M:
+    model: M | None = await model_class.get_by_id(db=db, id=id, load=load)
     if not model:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -18,6 +54,42 @@ async def get_model_by_id_or_404(db: AsyncSession, model_class: Type[M], id: UUI
     return model
 
 
+async def update_model_by_id_or_404(
+    db: AsyncSession, model_class: Type[M], id: UUID, data: dict
+) -> M:
+    model: M | None = await model_class.update(db=db, id=id, data=data)
+    if not model:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{model_class.__name__} with id {id} not found",
+        )
+    return model
+
+
+async def bulk_create_or_409(
+    db: AsyncSession,
+    model_class: Type[M],
+    data: Sequence[BaseModel],
+    atomic: bool,
+) -> BulkCreateResult[M]:
+    """Creates objects from the rows of a request, see `ModelMixin.bulk_create`"""
+    if len(data) > default_settings.BULK_CREATE_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"at most {default_settings.BULK_CREATE_MAX_ROWS} rows can be "
+            "created at once",
+        )
+    try:
+        return await model_class.bulk_create(
+            db, [row.model_dump() for row in data], atomic=atomic
+        )
+    except IntegrityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"no {model_class.__name__} was created: {e.orig}",
+        )
+
+
 async def get_one_model_obj_by_query_or_404(
     db: AsyncSession, statement: Executable, resource_name: str | None = None
 ) -> M:
@@ -28,3 +100,235 @@ async def get_one_model_obj_by_query_or_404(
             detail=f"{resource_name or 'resource'} not found",
         )
     return result
+
+
+class PageParams:
+    """The query parameters of a page of a list endpoint, use as a dependency"""
+
+    def __init__(
+        self,
+        cursor: Annotated[
+            str | None, Query(description="The `next_cursor` of the previous page")
+        ] = None,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+async def get_version(db: AsyncSession, *queries: Select) -> list:
+    """Provides the single rows of version queries as one row, in one round trip"""
+    subqueries = [query.subquery() for query in queries]
+    # The single rows are joined unconditionally, rather than listed as a cartesian
+    # product which SQLAlchemy warns about
+    joined = reduce(lambda left, right: left.join(right, true()), subqueries)
+    query = select(
+        *(column for subquery in subqueries for column in subquery.c)
+    ).select_from(joined)
+    return list((await db.execute(query)).one())
+
+
+def check_not_modified(request: Request, response: Response, version: Sequence):
+    """Sets the ETag of a response, or answers with a 304 when the client's copy is
+    current so the response's rows don't need to be loaded.
+
+    The ETag is derived from the request's url and `version`, which must change
+    whenever the response would.
+    """
+    key = repr((request.url.path, request.url.query, jsonable_encoder(version)))
+    etag = f'W/"{hashlib.sha256(key.encode("utf8")).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    # Weak comparison, a client may drop the weak prefix of the validator
+    if_none_match = request.headers.get("If-None-Match", "")
+    validators = [
+        value.strip().removeprefix("W/") for value in if_none_match.split(",")
+    ]
+    if "*" in validators or etag.removeprefix("W/") in validators:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+async def paginate_or_400(
+    db: AsyncSession,
+    model_class: Type[M],
+    page: PageParams,
+    where: Sequence = (),
+    load: Sequence[str] = (),
+) -> Page[M]:
+    try:
+        return await model_class.paginate(
+            db, cursor=page.cursor, limit=page.limit, where=where, load=load
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def get_class_export(
+    class_: Class, format: FileFormat, wait: bool = False
+) -> BufferedReader | AsyncIterator[bytes]:
+    """Provides a cached export of a class opened for reading or a stream rendering it.
+
+    The class must be loaded with `Class.EXPORT_RELATIONSHIPS`. A rendered export is
+    stored in the export cache as it's streamed, under the roster version read in the
+    same snapshot as its rows.
+
+    Raises:
+        ExportQueueFullError: when the export executor can't queue the render,
+            unless `wait` is set.
+    """
+    metadata = await class_.get_export_metadata()
+    cache_key = export_cache.get_key(class_.id, format, class_.roster_version, metadata)
+    if cached := export_cache.get(cache_key):
+        return cached
+
+    session = get_snapshot_session()
+    try:
+        # The first statement takes the snapshot the rows are read from
+        query = select(Class.roster_version).where(Class.id == class_.id)
+        roster_version = (await session.execute(query)).scalar_one()
+        if format == FileFormat.CSV:
+            content = copy_query_to_csv(class_.get_roster_query(), session=session)
+        else:
+            exporter = get_exporter(format)
+            exporter.load_data(await class_.get_export_data(session))
+            content = await export_executor.export(exporter, wait=wait)
+            if isinstance(exporter, DocumentExporter):
+                # A rendered document has read its rows, the connection isn't held
+                # while it's downloaded
+                await session.close()
+    except BaseException:
+        await session.close()
+        raise
+    cache_key = export_cache.get_key(class_.id, format, roster_version, metadata)
+    return export_cache.store(cache_key, close_after(content, session))
+
+
+async def close_after(
+    content: AsyncIterator[bytes], session: AsyncSession
+) -> AsyncIterator[bytes]:
+    """Passes `content` through and closes the session it's read from once it ends"""
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        await session.close()
+
+
+async def export_classes(
+    classes: Sequence[Class], format: FileFormat
+) -> AsyncIterator[tuple[str, IO[bytes]]]:
+    """Exports classes in parallel and provides each export as soon as it's rendered.
+
+    At most as many classes as the export executor has workers are rendered at once,
+    rendered exports are spooled to temporary files until they're consumed.
+    """
+    renders = asyncio.Semaphore(export_executor.max_workers)
+
+    async def render(class_: Class) -> tuple[str, IO[bytes]]:
+        async with renders:
+            export = await get_class_export(class_, format, wait=True)
+            if isinstance(export, BufferedReader):
+                file = export
+            else:
+                file = tempfile.TemporaryFile()
+                async for chunk in export:
+                    file.write(chunk)
+                file.seek(0)
+        department = class_.department.name.replace("/", "-")
+        name = (class_.display_name or str(class_.level.value)).replace("/", "-")
+        return f"{department}/{name}-{class_.id}.{format.value}", file
+
+    tasks = [asyncio.create_task(render(class_)) for class_ in classes]
+    try:
+        for task in asyncio.as_completed(tasks):
+            name, file = await task
+            with file:
+                yield name, file
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_classes_archive_response(
+    classes: Sequence[Class], format: FileFormat, filename: str
+) -> StreamingResponse:
+    """Provides a response streaming a zip archive of the exports of classes"""
+    try:
+        export_executor.check_capacity()
+    except ExportQueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, try again later",
+        )
+    return StreamingResponse(
+        stream_zip(export_classes(classes, format)),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}.zip"
+        },
+    )
+
+
+async def spool_request_body(request: Request) -> IO[bytes]:
+    """Provides the request's body in a temporary file, spooled to disk when large.
+
+    Raises:
+        HTTPException: when the body is larger than `IMPORT_MAX_BYTES`.
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > IMPORT_MAX_BYTES:
+            file.close()
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"files larger than {IMPORT_MAX_BYTES} bytes can't be imported",
+            )
+        file.write(chunk)
+    file.seek(0)
+    return file
+
+
+async def import_class_students(
+    db: AsyncSession, class_id: UUID, file: IO[bytes], format: FileFormat
+) -> tuple[int, list[RowError]]:
+    """Imports the students of a roster file into a class in one transaction.
+
+    The rows are read and validated in batches off the event loop, each batch of
+    valid rows is inserted with multi-row inserts. Rows which are invalid, or whose
+    registration numbers are already on the class' roster, are reported.
+
+    Raises:
+        ImportFileError: when the file can't be read.
+    """
+    imported, errors = 0, []
+    batches = validate_rows(
+        read_rows(file, format), CreateStudentSchema, {"class_id": class_id}
+    )
+    async for batch in iterate_in_threadpool(batches):
+        errors.extend(batch.errors)
+        students = {
+            row_no: {**student.model_dump(), "id": uuid4()}
+            for row_no, student in batch.rows.items()
+        }
+        inserted = await Student.import_many(db, list(students.values()))
+        imported += len(inserted)
+        errors.extend(
+            RowError(
+                row_no,
+                [
+                    {
+                        "field": None,
+                        "message": "a student with this matriculation or JAMB "
+                        "registration number is already in the class",
+                    }
+                ],
+            )
+            for row_no, student in students.items()
+            if student["id"] not in inserted
+        )
+    if imported:
+        await Class.bump_roster_version(db, class_id)
+    await db.commit()
+    return imported, sorted(errors, key=lambda error: error.row)